@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Placement information for flip flops from a DEF file
+#   ------------------------------------------------------
+#
+#  Description: Reads the COMPONENTS section of a DEF file (the output of the
+#               place & route step) and finds groups of flip flops, which are
+#               placed so close to each other, that a single particle can upset
+#               all of them at once (multi bit upsets, MBU).
+#               The neighbours are searched with a uniform grid with the
+#               cluster radius as the cell size, so every flip flop only has to
+#               be compared with the ones in the 3x3 surrounding grid cells.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import re           # regular expressions
+
+
+# a placed component: - <name> <cell> ... + PLACED|FIXED ( <x> <y> ) <orient>
+_reComponent = re.compile('^-\s+(?P<name>\S+)\s+(?P<cell>\S+).*?\+\s*(?:PLACED|FIXED|COVER)\s*\(\s*(?P<x>-?\d+)\s+(?P<y>-?\d+)\s*\)', re.DOTALL)
+_reUnits = re.compile('^UNITS\s+DISTANCE\s+MICRONS\s+(?P<units>\d+)')
+_reDivider = re.compile('^DIVIDERCHAR\s+"(?P<char>.)"')
+
+
+# Bring an instance name into a form, which is the same for the netlist and
+# the DEF file (no escape characters, same hierarchy divider)
+def normalizeName(name, divider="/"):
+    return name.replace("\\", "").replace(divider, "/").strip()
+
+
+# Read the placement of all components of a DEF file.
+# Returns a dict with the normalized component names as keys and their (x, y)
+# position in microns as values.
+def readDEF(filename):
+    placement = {}
+    units = 1.0
+    divider = "/"
+    inComponents = False
+    statement = ""
+
+    defFile = open(filename, 'r')
+    for line in defFile:
+        line = line.strip()
+        if not inComponents:
+            m = _reUnits.match(line)
+            if m:
+                units = float(m.group('units'))
+            m = _reDivider.match(line)
+            if m:
+                divider = m.group('char')
+            if line.startswith("COMPONENTS"):
+                inComponents = True
+            continue
+
+        if line.startswith("END COMPONENTS"):
+            break
+
+        # one component may span over several lines until the ';'
+        statement += " " + line
+        if not line.endswith(";"):
+            continue
+
+        m = _reComponent.match(statement.strip())
+        if m:
+            name = normalizeName(m.group('name'), divider)
+            placement[name] = (int(m.group('x'))/units, int(m.group('y'))/units)
+        statement = ""
+    defFile.close()
+
+    return placement
+
+
+# Find all flip flops within the given radius (in microns) of each other.
+# The input is a list of (x, y) positions, where None marks flip flops without
+# placement information. Every flip flop with at least one neighbour defines a
+# group containing itself and all of its neighbours; identical groups are only
+# returned once. The groups are sorted lists of indices into the input.
+def findClusters(positions, radius):
+    radius = float(radius)
+    if radius <= 0:
+        raise ValueError("the cluster radius must be positive, not {0}".format(radius))
+    radius2 = radius*radius
+
+    # sort the flip flops into grid cells of the size of the radius
+    grid = {}
+    for i, pos in enumerate(positions):
+        if pos is None:
+            continue
+        cell = (int(pos[0] // radius), int(pos[1] // radius))
+        grid.setdefault(cell, []).append(i)
+
+    # only the surrounding cells can hold neighbours
+    neighbours = {}
+    for (cx, cy), members in grid.iteritems():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                # every pair of cells only once
+                if (dx, dy) < (0, 0):
+                    continue
+                others = grid.get((cx+dx, cy+dy))
+                if others is None:
+                    continue
+                sameCell = dx == 0 and dy == 0
+                for n, i in enumerate(members):
+                    xi, yi = positions[i]
+                    for j in (others[n+1:] if sameCell else others):
+                        xj, yj = positions[j]
+                        if (xi-xj)*(xi-xj) + (yi-yj)*(yi-yj) <= radius2:
+                            neighbours.setdefault(i, [i]).append(j)
+                            neighbours.setdefault(j, [j]).append(i)
+
+    # each flip flop with its neighbours is a group, skip duplicates
+    groups = []
+    seen = set()
+    for i in sorted(neighbours.iterkeys()):
+        group = tuple(sorted(neighbours[i]))
+        if group in seen:
+            continue
+        seen.add(group)
+        groups.append(list(group))
+
+    return groups
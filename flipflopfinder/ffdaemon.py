@@ -0,0 +1,239 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Flip flop finder as a background service
+#   ------------------------------------------
+#
+#  Description: Parses a synthesized verilog project once and keeps the list of
+#               flip flops and the hierarchy in memory. Other tools can ask for
+#               flip flops via a unix socket, which is answered in milliseconds
+#               instead of parsing the netlist again. If the netlist changes on
+#               disk, it is parsed again with the next query.
+#
+#               The protocol is line based. A client sends one command line,
+#               the server answers with any number of lines and an empty line
+#               at the end. Errors start with "ERROR", also if the netlist
+#               could not be parsed. Only one server runs on a socket file.
+#
+#               Commands:
+#                 id <n>              path of the flip flop with ID n
+#                 find <glob>         IDs and paths of all matching flip flops
+#                 count               total number of flip flops
+#                 modules             number of flip flops per module
+#                 package <file>      write the VHDL package to this file
+#                 reload              parse the netlist again
+#                 shutdown            stop the server
+#
+#  Revisions:
+#    1.0 Initial revision
+#    1.1 Use the FlipFlopFinder object instead of the module state
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import sys          # system functions (like exit)
+import os           # file status, remove the socket file
+import socket       # client side of the socket
+import threading    # lock the netlist while it is reloaded
+import argparse     # command line options
+import SocketServer # server side of the socket
+from fnmatch import fnmatchcase                     # glob matching of paths
+
+import flipflopfinder as fff
+
+
+# verbose level
+_verbose = 1
+
+# default socket file
+_socketFile = "/tmp/ffdaemon.sock"
+
+
+# The netlist with all flip flops found in it
+class Netlist(object):
+    def __init__(self, filename, topLevelName):
+        self.filename = filename
+        self.topLevelName = topLevelName
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.load()
+
+    # parse the netlist and keep the results. The old results and time stamp
+    # are only replaced once the new ones are complete, so a failed parse is
+    # tried again with the next query.
+    def load(self):
+        mtime = os.path.getmtime(self.filename)
+        finder = fff.FlipFlopFinder(self.topLevelName, verbose=max(_verbose - 1, 0))
+        finder.parseFile(self.filename)
+        finder.buildInstanceList()
+        moduleCounts = {}
+        for FF in finder.FF:
+            moduleCounts[FF['module']] = moduleCounts.get(FF['module'], 0) + 1
+
+        self.finder = finder
+        self.paths = finder.verilogInstanceStrings
+        self.moduleCounts = moduleCounts
+        self.mtime = mtime
+
+        if _verbose > 0:
+            print "Loaded {0} flip flops from {1}".format(len(self.paths), self.filename)
+
+    # parse again, if the file has changed since the last time
+    def update(self):
+        if os.path.getmtime(self.filename) != self.mtime:
+            self.load()
+
+    # answer a single command
+    def query(self, line):
+        parts = line.split(None, 1)
+        if not parts:
+            return ["ERROR empty command"]
+        command = parts[0]
+        argument = parts[1] if len(parts) > 1 else ""
+
+        with self.lock:
+            if command == "reload":
+                self.load()
+                return ["OK {0}".format(len(self.paths))]
+            self.update()
+
+            if command == "id":
+                try:
+                    ID = int(argument)
+                    if ID < 0:
+                        raise IndexError(ID)
+                    return [self.paths[ID]]
+                except (ValueError, IndexError):
+                    return ["ERROR no flip flop with ID '{0}'".format(argument)]
+
+            elif command == "find":
+                return ["{0} {1}".format(i, path) for i, path in enumerate(self.paths)
+                        if fnmatchcase(path, argument)]
+
+            elif command == "count":
+                return [str(len(self.paths))]
+
+            elif command == "modules":
+                return ["{0} {1}".format(module, count)
+                        for module, count in sorted(self.moduleCounts.iteritems())]
+
+            elif command == "package":
+                if not argument:
+                    return ["ERROR no output file given"]
+                self.finder.saveToOutput(argument)
+                return ["OK {0}".format(argument)]
+
+        return ["ERROR unknown command '{0}'".format(command)]
+
+
+# Answers the commands of one client connection
+class QueryHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if line == "shutdown":
+                self.wfile.write("OK\n\n")
+                self.wfile.flush()
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            # a failed parse or query is answered, the server keeps running
+            try:
+                answer = self.server.netlist.query(line)
+            except Exception as e:
+                answer = ["ERROR {0}: {1}".format(type(e).__name__, e)]
+            self.wfile.write("".join(x + "\n" for x in answer) + "\n")
+            self.wfile.flush()
+
+
+class QueryServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+# Is a server answering on the socket file? If the file is left over from a
+# server which has died, nobody accepts the connection.
+def serverRunning(socketFile):
+    if not os.path.exists(socketFile):
+        return False
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socketFile)
+    except socket.error:
+        return False
+    finally:
+        client.close()
+    return True
+
+
+# Start the server and answer queries until it is shut down. A socket file
+# left over by a dead server is replaced, a running server is not.
+def serve(netlist, socketFile):
+    if serverRunning(socketFile):
+        raise RuntimeError("another server is running on {0}".format(socketFile))
+    if os.path.exists(socketFile):
+        os.remove(socketFile)
+    server = QueryServer(socketFile, QueryHandler)
+    server.netlist = netlist
+    if _verbose > 0:
+        print "Listening on {0}".format(socketFile)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socketFile)
+
+
+# Send a command to a running server and return the answer lines
+def query(command, socketFile=_socketFile):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socketFile)
+    client.sendall(command.strip() + "\n")
+    answer = client.makefile('r')
+    lines = []
+    for line in answer:
+        if line == "\n":
+            break
+        lines.append(line.rstrip("\n"))
+    client.close()
+    return lines
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Keep the flip flops of a synthesized verilog project in memory and "
+                    "answer queries about them via a unix socket.")
+    parser.add_argument("verilog_project", nargs="?", help="The path to the verilog file containing the project after synthesis.")
+    parser.add_argument("toplevel_name", nargs="?", help="The name used in the testbench to instantiate the top level.")
+    parser.add_argument("--socket", default=_socketFile, help="The socket file. Default: %(default)s")
+    parser.add_argument("--query", metavar="COMMAND", help="Send this command to a running server and print the answer.")
+    args = parser.parse_args()
+    if args.query is None and args.toplevel_name is None:
+        parser.error("the verilog project and the top level name are needed to start the server")
+    return args
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    if args.query is not None:
+        answer = query(args.query, args.socket)
+        for line in answer:
+            print line
+        if answer and answer[0].startswith("ERROR"):
+            sys.exit(1)
+        return
+
+    # check before the netlist is parsed, serve() checks again
+    try:
+        if serverRunning(args.socket):
+            raise RuntimeError("another server is running on {0}".format(args.socket))
+        serve(Netlist(args.verilog_project, args.toplevel_name), args.socket)
+    except RuntimeError as e:
+        sys.stderr.write("{0}\n".format(e))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
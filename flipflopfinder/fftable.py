@@ -0,0 +1,294 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Flip Flop Table
+#   -----------------
+#
+#  Description: A compact binary file with the paths of all flip flops found by
+#               flipflopfinder.py, for other programs (campaign runner, result
+#               database, lookup scripts). The file is memory mapped, so opening
+#               it takes no time whatever its size, and the path of a flip flop
+#               ID or the ID of a path is found without reading the rest.
+#
+#               The paths share long hierarchical prefixes, so they are front
+#               coded: every path only stores the length of the prefix it has in
+#               common with the path before and the rest. Every _blockSize paths
+#               a block starts with a complete path, the offsets of the blocks
+#               are the index to find a path by ID. The cell type and the module
+#               of every flip flop are columns of numbers into string tables.
+#               A hash table of the IDs finds the ID of a path.
+#
+#               All numbers are little endian. The file starts with a header of
+#               the counts and the offsets of all sections:
+#                 paths        front coded paths: <prefix length> <suffix
+#                              length> (7 bits per byte, the highest bit set
+#                              if more bytes follow) and the suffix
+#                 blocks       uint32 offset into paths of every block
+#                 cell types   uint16 index into the type names per flip flop
+#                 modules      uint32 index into the module names per flip flop
+#                 hash         uint32 IDs by CRC32 of the path, linear probing,
+#                              0xffffffff is empty
+#                 type names   string table: uint32 offsets (n+1), then the text
+#                 module names string table
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import os
+import sys
+import zlib
+import mmap
+import struct
+import argparse
+from array import array
+
+
+_magic = "FFTABLE1"
+
+# nFF, block size, type names, module names, hash bits and the offsets of the
+# sections and the end of the file
+_header = struct.Struct("<8sIIIII8Q")
+
+# every this many paths one is stored completely
+_blockSize = 16
+
+_empty = 0xffffffff
+
+
+def pathHash(path):
+    return zlib.crc32(path) & 0xffffffff
+
+
+# A length with 7 bits per byte, lowest first
+def _varint(value):
+    data = ""
+    while value > 0x7f:
+        data += chr(0x80 | (value & 0x7f))
+        value >>= 7
+    return data + chr(value)
+
+
+# Returns the value and the offset behind it
+def _readVarint(data, offset):
+    value = shift = 0
+    while True:
+        byte = ord(data[offset])
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+# the arrays are written little endian, whatever this machine is
+def _writeArray(outFile, values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(outFile)
+
+
+def _writeStrings(outFile, strings):
+    offsets = array('I', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    _writeArray(outFile, offsets)
+    outFile.write("".join(strings))
+
+
+# Write the table. rows are (path, cell type, module) in the order of the flip
+# flop IDs, they are written while they come in.
+def writeTable(filename, rows):
+    outFile = open(filename, 'wb', 1 << 16)
+    outFile.write("\0" * _header.size)
+
+    blocks = array('I')
+    types = array('H')
+    modules = array('I')
+    hashes = array('I')
+    typeIDs = {}
+    moduleIDs = {}
+    poolSize = 0
+    previous = ""
+    for path, cellType, module in rows:
+        if len(hashes) % _blockSize == 0:
+            if poolSize > 0xffffffff:
+                raise ValueError("the paths need more than 4 GB")
+            blocks.append(poolSize)
+            prefix = 0
+        else:
+            prefix = 0
+            limit = min(len(path), len(previous))
+            while prefix < limit and path[prefix] == previous[prefix]:
+                prefix += 1
+        entry = _varint(prefix) + _varint(len(path) - prefix) + path[prefix:]
+        outFile.write(entry)
+        poolSize += len(entry)
+        previous = path
+
+        types.append(typeIDs.setdefault(cellType, len(typeIDs)))
+        modules.append(moduleIDs.setdefault(module, len(moduleIDs)))
+        hashes.append(pathHash(path))
+
+    nFF = len(hashes)
+    hashBits = 1
+    while (1 << hashBits) < 2 * nFF:
+        hashBits += 1
+    table = array('I', [_empty]) * (1 << hashBits)
+    mask = (1 << hashBits) - 1
+    for ID, value in enumerate(hashes):
+        slot = value & mask
+        while table[slot] != _empty:
+            slot = (slot + 1) & mask
+        table[slot] = ID
+
+    offsets = [_header.size]
+    for values in (blocks, types, modules, table):
+        offsets.append(outFile.tell())
+        _writeArray(outFile, values)
+    offsets.append(outFile.tell())
+    _writeStrings(outFile, sorted(typeIDs, key=typeIDs.get))
+    offsets.append(outFile.tell())
+    _writeStrings(outFile, sorted(moduleIDs, key=moduleIDs.get))
+    offsets.append(outFile.tell())
+
+    outFile.seek(0)
+    outFile.write(_header.pack(_magic, nFF, _blockSize, len(typeIDs), len(moduleIDs), hashBits, *offsets))
+    outFile.close()
+    return nFF
+
+
+# A table opened read only. Only the header is read, everything else comes
+# from the mapped file when it is needed.
+class FFTable(object):
+    def __init__(self, filename):
+        tableFile = open(filename, 'rb')
+        try:
+            self.data = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            tableFile.close()
+        if len(self.data) < _header.size or self.data[:len(_magic)] != _magic:
+            raise ValueError("{0} is no flip flop table".format(filename))
+        header = _header.unpack_from(self.data)
+        (self.nFF, self.blockSize, self.nTypes, self.nModules, self.hashBits,
+         self.pathStart, self.blockStart, self.typeStart, self.moduleStart, self.hashStart,
+         self.typeNameStart, self.moduleNameStart, end) = header[1:]
+        if end != len(self.data):
+            raise ValueError("{0} is truncated".format(filename))
+
+    def close(self):
+        self.data.close()
+
+    def __len__(self):
+        return self.nFF
+
+    def _uint32(self, start, index):
+        return struct.unpack_from("<I", self.data, start + 4*index)[0]
+
+    def _string(self, start, count, index):
+        if not 0 <= index < count:
+            raise IndexError(index)
+        first, last = struct.unpack_from("<II", self.data, start + 4*index)
+        text = start + 4*(count+1)
+        return self.data[text+first:text+last]
+
+    # The path of a flip flop ID: decode its block up to the ID
+    def path(self, ID):
+        if not 0 <= ID < self.nFF:
+            raise IndexError(ID)
+        offset = self.pathStart + self._uint32(self.blockStart, ID // self.blockSize)
+        path = ""
+        for i in range(ID % self.blockSize + 1):
+            prefix, offset = _readVarint(self.data, offset)
+            length, offset = _readVarint(self.data, offset)
+            path = path[:prefix] + self.data[offset:offset+length]
+            offset += length
+        return path
+
+    def cellType(self, ID):
+        if not 0 <= ID < self.nFF:
+            raise IndexError(ID)
+        index = struct.unpack_from("<H", self.data, self.typeStart + 2*ID)[0]
+        return self._string(self.typeNameStart, self.nTypes, index)
+
+    def module(self, ID):
+        if not 0 <= ID < self.nFF:
+            raise IndexError(ID)
+        return self._string(self.moduleNameStart, self.nModules, self._uint32(self.moduleStart, ID))
+
+    # The ID of a path, or None if there is no such flip flop. If a path is in
+    # the table more than once, this is the first ID.
+    def find(self, path):
+        mask = (1 << self.hashBits) - 1
+        slot = pathHash(path) & mask
+        while True:
+            ID = self._uint32(self.hashStart, slot)
+            if ID == _empty:
+                return None
+            if self.path(ID) == path:
+                return ID
+            slot = (slot + 1) & mask
+
+    # All paths in the order of the IDs, decoded in one pass
+    def __iter__(self):
+        offset = self.pathStart
+        path = ""
+        for ID in xrange(self.nFF):
+            prefix, offset = _readVarint(self.data, offset)
+            length, offset = _readVarint(self.data, offset)
+            path = path[:prefix] + self.data[offset:offset+length]
+            offset += length
+            yield path
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Look up flip flops in a table written by flipflopfinder.py --table.")
+    parser.add_argument("table", help="The flip flop table.")
+    parser.add_argument("keys", nargs="*", metavar="ID|PATH",
+                        help="Flip flop IDs or paths to look up. Without any, the size of the "
+                             "table is printed.")
+    parser.add_argument("--dump", action="store_true",
+                        help="Print all flip flops: ID, path, cell type and module.")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    table = FFTable(args.table)
+    if args.dump:
+        for ID, path in enumerate(table):
+            sys.stdout.write("{0} {1} {2} {3}\n".format(ID, path, table.cellType(ID), table.module(ID)))
+    elif not args.keys:
+        print "{0}: {1} flip flops, {2} cell types, {3} modules, {4} kB".format(
+            args.table, len(table), table.nTypes, table.nModules, os.path.getsize(args.table) / 1024)
+
+    status = 0
+    for key in args.keys:
+        if key.isdigit():
+            ID = int(key)
+            if ID >= len(table):
+                print "{0}: no such flip flop".format(key)
+                status = 1
+                continue
+        else:
+            ID = table.find(key)
+            if ID is None:
+                print "{0}: no such flip flop".format(key)
+                status = 1
+                continue
+        print "{0} {1} {2} {3}".format(ID, table.path(ID), table.cellType(ID), table.module(ID))
+    table.close()
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
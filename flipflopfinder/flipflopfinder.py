@@ -15,6 +15,15 @@
 #    1.0 Initial revision
 #    1.1 UMC and IBM compatible
 #    1.2 Move to regular expressions for parsing
+#    1.3 Multi bit upset groups from the placement (DEF file)
+#    1.4 State of a run in a FlipFlopFinder object (one per netlist, also
+#        for ffdaemon), batch processing
+#    1.5 Count and list modes, load the template engine only when needed
+#    1.6 Injection schedule for many SEUs in one simulation run
+#    1.7 Stream the modules from the file through the search into the output,
+#        keep only the flip flops of every module
+#    1.8 Search modules with the same body (uniquified by synthesis) only once
+#    1.9 Flip flop table for other programs
 #
 # ------------------------------------------------------------------------------
 
@@ -22,9 +31,18 @@
 import sys          # system functions (like exit)
 import time         # time functions
 import re           # regular expressions
-from os.path import basename, splitext, getsize     # some useful functions for filenames
+import hashlib      # hashes of module bodies
+import argparse     # command line options
+from os.path import basename, splitext, getsize, exists, dirname, join, abspath
 from pprint import pprint                           # nice print (used for debug)
-from Cheetah.Template import Template               # template file
+
+# The heavy modules are only imported where they are needed, so counting and
+# listing flip flops starts fast:
+#   Cheetah.Template   template file     (saveToOutput)
+#   defPlacement       DEF files         (searchMBUgroups)
+#   injectionSchedule  SEU schedules     (saveSchedule)
+#   fftable            flip flop tables  (saveTable)
+#   multiprocessing    batch processing  (processNetlists)
 
 
 # verbose level
@@ -39,234 +57,508 @@ _FFcellsUMC = ['DFCM', 'DFCQM', 'DFCQRSM', 'DFCRSM', 'DFEM', 'DFEQM', 'DFEQRM',
 _FFcellsUMC_re = re.compile('[S]?(?P<type>[A-Z]+)[1248]{1}NM')
 
 
-# initialize global values
-_inFile = None
-_outFile = None
-_topLevelName = ""
-_verilogTokens = []
-_FF = []
-_technology = "?"
-_instances = {}
-_listOfModules = []
-_verilogInstanceStrings = []
-
-
-# Set input and output files
-def setInputFile(filename):
-    global _inFile
-    _inFile = file(filename, 'r')
-    if _verbose > 0:
-        print "Input file:  " + filename
-
-def setOutputFile(filename):
-    global _outFile
-    _outFile = file(filename, 'w')
-    if _verbose > 0:
-        print "Output file:  " + filename
-
-def setTopLevelName(name):
-    global _topLevelName
-    _topLevelName = name
-    if _verbose > 0:
-        print "Top Level Instance Name:  " + name
-
-
-# Parse the file
-def parseFile():
-    # read content into memory
-    global _inFile, _verilogTokens, _listOfModules
-    if _verbose > 0:
-        print "\nReading file {0} ...".format(_inFile.name)
-    lines = _inFile.readlines()
-    nlines = len(lines)
-    _inFile.close()  # we don't need that anymore
-
-    # convert text into tokens we can handle
-    if _verbose > 0:
-        print "  parse the input into memory ..."
-    startTime = time.clock()
-    lines = "".join(lines)
-    _verilogTokens = parseVerilog(lines)
-    _listOfModules = [x[0] for x in _verilogTokens]
-    stopTime = time.clock()
-    totalTime = stopTime - startTime
-
-    # some information output
-    if _verbose > 0:
-        if totalTime > 0:
-            lineRate = nlines/totalTime
+# The template is searched in the working directory first, so a customised
+# copy there is used, and then next to this script.
+def findTemplateFile(filename=_templateFile):
+    if exists(filename):
+        return filename
+    return join(dirname(abspath(__file__)), filename)
+
+
+# regular expressions for the synthesizer's output
+_reModuleStart = re.compile('^module (?P<module>\w+)\([\w, \n]+\);', re.MULTILINE)
+_reModuleName = re.compile('^module (?P<module>\w+)\(')
+_reInstance = re.compile('(?P<type>\w+) [\\\\]?(?P<name>[\w\[\]]+)\s?\([\w\s\\\\\[\]\(\){},.\']+\);', re.MULTILINE)
+
+
+# A quick first pass over the lines, which only collects the module names.
+# They are needed to tell instances of modules from standard cells, before
+# the modules themselves are parsed. Returns the names and the number of lines.
+def scanModuleNames(lines):
+    names = []
+    nlines = 0
+    for line in lines:
+        nlines += 1
+        match = _reModuleName.match(line)
+        if match:
+            names.append(match.group('module'))
+    return names, nlines
+
+
+# Read the modules one after the other, only the lines of the current module
+# are kept in memory. Yields the module name and the text of its body (all
+# after the module header).
+def iterModuleBodies(lines):
+    moduleLines = None
+    for line in lines:
+        if moduleLines is None:
+            if line.startswith('module '):
+                moduleLines = [line]
+        elif line.rstrip('\n') == 'endmodule':
+            text = "".join(moduleLines)
+            moduleLines = None
+            moduleStartMatch = _reModuleStart.match(text)
+            if moduleStartMatch:
+                yield moduleStartMatch.group('module'), text[moduleStartMatch.end():]
         else:
-            lineRate = float("inf")
-        print "  done converting {0} lines and {1} modules".format(nlines, len(_listOfModules))
-        print "  time spent: {0:.2f} sec  ({1:.2e} lines/sec)\n".format(totalTime, lineRate)
-    if _verbose > 2:
-        print "Found the following modules:"
-        pprint(_listOfModules, indent=2)
-        print ""
+            moduleLines.append(line)
 
 
-def parseVerilog(lines):
-    # regular expressions for the synthesizer's output
-    moduleStart_re = re.compile('^module (?P<module>\w+)\([\w, \n]+\);', re.MULTILINE)
-    moduleEnd_re = re.compile('^endmodule$', re.MULTILINE)
-    instance_re = re.compile('(?P<type>\w+) [\\\\]?(?P<name>[\w\[\]]+)\s?\([\w\s\\\\\[\]\(\){},.\']+\);', re.MULTILINE)
+# Parse the modules one after the other. Yields the module name and the list
+# of its instances as (type, name) tuples.
+def iterModules(lines):
+    for moduleName, body in iterModuleBodies(lines):
+        yield moduleName, _reInstance.findall(body)
 
-    moduleStartPos = 0
-    moduleEndPos = 0
-    moduleList = []
-    while True:
 
-        # determine the span of the module
-        moduleStartMatch = moduleStart_re.search(lines, moduleEndPos)
-        if not moduleStartMatch: break  # nothing more to do
-        moduleStartPos = moduleStartMatch.end()
-        moduleEndMatch = moduleEnd_re.search(lines, moduleStartPos)
-        moduleEndPos = moduleEndMatch.start()
+# Synthesis uniquifies modules: foo_0, foo_1, ... all have the same body,
+# except where the body uses the name of its own module (like foo_0_reg). The
+# name is replaced by a placeholder, then the hash of the body is the same for
+# all of them and a body is only parsed and searched once. Returns the
+# normalized body, or None if the placeholder itself is in the body.
+_namePlaceholder = "__MODULE_NAME__"
 
-        # find the submodules
-        instancesMatch = instance_re.findall(lines, moduleStartPos, moduleEndPos)
+def normalizeBody(moduleName, body):
+    if _namePlaceholder in body:
+        return None
+    return body.replace(moduleName, _namePlaceholder)
 
-        # build a list
-        module = [moduleStartMatch.group('module'), instancesMatch]
-        moduleList.append(module)
 
-    return moduleList
+# Put the module name back into the instances of a normalized body
+def denormalizeInstances(instances, moduleName):
+    return [(instanceType.replace(_namePlaceholder, moduleName), instanceName.replace(_namePlaceholder, moduleName))
+            for instanceType, instanceName in instances]
 
 
-
-# Search and find Flip Flops
-def searchFlipFlops():
-    global _instances, _technology
-
-    if _verbose > 0:
-        print "Searching for flip flops ..."
-    for module in _verilogTokens:
-        moduleName = module[0]
-        for instance in module[1]:
-            instanceType = instance[0]
-            instanceName = instance[1]
+# All modules of a netlist at once: a list of [module name, instances]
+def parseVerilog(lines):
+    return [[module, instances] for module, instances in iterModules(lines.splitlines(True))]
+
+
+# Cheetah writes the output through a transaction. This one passes everything
+# directly into the output file, instead of collecting it in a string first.
+class FileTransaction(object):
+    def __init__(self, outFile):
+        self.outFile = outFile
+
+    def response(self):
+        return self.outFile
+
+
+# The paths of all flip flops for the template. They are generated again from
+# the per module summaries every time the template loops over them, instead of
+# being kept in memory.
+class InstancePaths(object):
+    def __init__(self, finder, suffix=None):
+        self.finder = finder
+        self.suffix = suffix
+
+    def __len__(self):
+        return self.finder.nFF
+
+    def __iter__(self):
+        for path, placementName in self.finder.iterInstances():
+            yield path if self.suffix is None else path[:-1] + self.suffix
+
+
+# All the state of processing one netlist. Every netlist needs its own object,
+# so several of them can be processed in the same process.
+class FlipFlopFinder(object):
+    def __init__(self, topLevelName="", verbose=None, templateFile=None):
+        self.topLevelName = topLevelName
+        self.verbose = _verbose if verbose is None else verbose
+        self.templateFile = findTemplateFile() if templateFile is None else templateFile
+
+        self.moduleFFs = []
+        self.nFF = 0
+        self._FF = None
+        self.technology = "?"
+        self.instances = {}
+        self.listOfModules = []
+        self.modulePaths = {}
+        self.verilogInstanceStrings = []
+        self.FFplacementNames = []
+        self.MBUgroups = []
+
+
+    # Parse the file and search the flip flops. The modules are streamed from
+    # the file into the search, only the flip flops of every module and the
+    # hierarchy are kept.
+    def parseFile(self, filename):
+        if self.verbose > 0:
+            print "\nReading file {0} ...".format(filename)
+        inFile = open(filename, 'r')
+        self.listOfModules, nlines = scanModuleNames(inFile)
+        inFile.seek(0)
+
+        if self.verbose > 0:
+            print "  parse the modules and search for flip flops ..."
+        startTime = time.clock()
+        modules = set(self.listOfModules)
+        # Hash of the normalized body -> (flip flops, submodules), shared by
+        # all modules with this body. If the body used its module name, the
+        # normalized instances are kept instead and searched again with the
+        # name of each module, as the name may also change which instances
+        # are modules. The technology is not part of the key: it only changes
+        # from '?' once, to the technology of the first flip flop found, and a
+        # body searched before gives the same result after that.
+        bodies = {}
+        nShared = 0
+        for moduleName, body in iterModuleBodies(inFile):
+            normalized = normalizeBody(moduleName, body)
+            key = None if normalized is None else hashlib.sha1(normalized).digest()
+            named = normalized is not None and normalized != body
+            if key is not None and key in bodies:
+                nShared += 1
+                if named:
+                    FFs, submodules = self.searchModule(moduleName, denormalizeInstances(bodies[key], moduleName), modules)
+                else:
+                    FFs, submodules = bodies[key]
+            elif key is None:
+                FFs, submodules = self.searchModule(moduleName, _reInstance.findall(body), modules)
+            else:
+                instances = _reInstance.findall(normalized)
+                if named:
+                    bodies[key] = instances
+                    instances = denormalizeInstances(instances, moduleName)
+                FFs, submodules = self.searchModule(moduleName, instances, modules)
+                if not named:
+                    bodies[key] = (FFs, submodules)
+            self.addInstances(moduleName, submodules)
+            if FFs:
+                self.moduleFFs.append((moduleName, FFs))
+                self.nFF += len(FFs)
+        inFile.close()
+        stopTime = time.clock()
+        totalTime = stopTime - startTime
+
+        # some information output
+        if self.verbose > 0:
+            if totalTime > 0:
+                lineRate = nlines/totalTime
+            else:
+                lineRate = float("inf")
+            print "  done converting {0} lines and {1} modules".format(nlines, len(self.listOfModules))
+            print "  {0} modules have the same body as an earlier one".format(nShared)
+            print "  time spent: {0:.2f} sec  ({1:.2e} lines/sec)".format(totalTime, lineRate)
+            print "  found {0} flip flops.\n".format(self.nFF)
+        if self.verbose > 2:
+            print "Found the following modules:"
+            pprint(self.listOfModules, indent=2)
+            print ""
+
+
+    # Search the flip flops and the instances of other modules in one module.
+    # Returns both as lists of (type, name).
+    def searchModule(self, moduleName, instances, modules):
+        FFs = []
+        submodules = []
+        for instanceType, instanceName in instances:
             UMCmatch = _FFcellsUMC_re.match(instanceType)
 
             # check for FF cells from IBM
-            if (_technology == "IBM" or _technology == "?") and instanceType.split('_')[0] in _FFcellsIBM:
-                _technology = "IBM"
-                _FF.append({
-                    'type': instanceType,
-                    'name': instanceName,
-                    'module': moduleName
-                })
-                if _verbose > 1:
+            if (self.technology == "IBM" or self.technology == "?") and instanceType.split('_')[0] in _FFcellsIBM:
+                self.technology = "IBM"
+                FFs.append((instanceType, instanceName))
+                if self.verbose > 1:
                     print "  found {0} (IBM) for '{1}' in module '{2}'".format(instanceType, instanceName, moduleName)
 
             # check for FF cells from UMC
-            elif (_technology == "UMC" or _technology == "?") and UMCmatch and UMCmatch.group('type') in _FFcellsUMC:
-                _technology = "UMC"
-                _FF.append({
-                    'type': instanceType,
-                    'name': instanceName,
-                    'module': moduleName
-                })
-                if _verbose > 1:
+            elif (self.technology == "UMC" or self.technology == "?") and UMCmatch and UMCmatch.group('type') in _FFcellsUMC:
+                self.technology = "UMC"
+                FFs.append((instanceType, instanceName))
+                if self.verbose > 1:
                     print "  found {0} (UMC) for '{1}' in module '{2}'".format(instanceType, instanceName, moduleName)
 
-            # found a module, put it into dict. for reverse searching
-            if instanceType in _listOfModules:
-                _instances[instanceType] = {
-                    'name': instanceName,
-                    'parent': moduleName
-                }
-                if _verbose > 2:
-                    print "  instance '{0}' of type '{1}' is instantiated by '{2}'".format(instanceName, instanceType, moduleName)
+            # found a module
+            if instanceType in modules:
+                submodules.append((instanceType, instanceName))
+        return FFs, submodules
+
+
+    # Put the instances of modules into the dict. for reverse searching
+    def addInstances(self, moduleName, submodules):
+        for instanceType, instanceName in submodules:
+            self.instances[instanceType] = {
+                'name': instanceName,
+                'parent': moduleName
+            }
+            if self.verbose > 2:
+                print "  instance '{0}' of type '{1}' is instantiated by '{2}'".format(instanceName, instanceType, moduleName)
+
+
+    # The list of all flip flops as dicts with type, name and module
+    def searchFlipFlops(self):
+        self._FF = [{'type': FFtype, 'name': FFname, 'module': moduleName}
+                    for moduleName, FFs in self.moduleFFs for FFtype, FFname in FFs]
+
+
+    # The same list, built from the per module summaries when it is used first
+    @property
+    def FF(self):
+        if self._FF is None:
+            self.searchFlipFlops()
+        return self._FF
+
+
+    # The verilog path and the placement name of the instance of a module,
+    # the same for all flip flops inside
+    def modulePath(self, module):
+        if module not in self.modulePaths:
+            verilogPath = ""
+            placementPath = ""
+            parent = module
+            while parent in self.instances:
+                verilogPath = self.instances[parent]['name'] + "." + verilogPath
+                placementPath = self.instances[parent]['name'] + "/" + placementPath
+                parent = self.instances[parent]['parent']
+            self.modulePaths[module] = (verilogPath, placementPath)
+        return self.modulePaths[module]
+
+
+    # Generate the module, the type, the verilog path and the placement name
+    # of all flip flops
+    def iterFlipFlops(self):
+        # how is the inner part of the register called?
+        UMC = self.technology == "UMC"
 
-    # some information output
-    if _verbose > 0:
-        print "  found {0} flip flops.\n".format(len(_FF))
-    #pprint(_instances, indent=2)
-    #pprint(_FF, indent=2)
-    #print ""
+        for moduleName, FFs in self.moduleFFs:
+            verilogPath, placementPath = self.modulePath(moduleName)
+            for FFtype, FFname in FFs:
+                innerFF = FFtype + "_inst" if UMC else "i0"
 
+                # basis of the string
+                if "[" in FFname:
+                    verilogString = "\{0} .{1}.D".format(FFname, innerFF)
+                else:
+                    verilogString = "{0}.{1}.D".format(FFname, innerFF)
 
-# Take all the flip flops found and put them into a verilog instance list
-def buildInstanceList():
-    global _verilogInstanceStrings
-    for FF in _FF:
-        # how is the inner part of the register called?
-        if _technology == "UMC":
-            innerFF = FF['type'] + "_inst"
-        else:
-            innerFF = "i0"
+                # include parent modules and the top level
+                yield moduleName, FFtype, ":" + self.topLevelName + "." + verilogPath + verilogString, placementPath + FFname
 
-        # basis of the string
-        if "[" in FF['name']:
-            verilogString = "\{0} .{1}.D".format(FF['name'], innerFF)
-        else:
-            verilogString = "{0}.{1}.D".format(FF['name'], innerFF)
 
-        # include parent modules
-        module = FF['module']
-        while module in _instances.keys():
-            verilogString = _instances[module]['name'] + "." + verilogString
-            module = _instances[module]['parent']
+    # Generate the verilog path and the placement name of all flip flops
+    def iterInstances(self):
+        for moduleName, FFtype, verilogString, placementName in self.iterFlipFlops():
+            yield verilogString, placementName
 
-        # add top level
-        verilogString = ":" + _topLevelName + "." + verilogString
-        _verilogInstanceStrings.append(verilogString)
-        #print verilogString
 
+    # Take all the flip flops found and put them into a verilog instance list
+    def buildInstanceList(self):
+        for verilogString, placementName in self.iterInstances():
+            self.verilogInstanceStrings.append(verilogString)
+            self.FFplacementNames.append(placementName)
 
-def saveToOutput():
-    global _outFile
-    t = Template(file=_templateFile)
 
-    if _verbose > 0:
-        print "Writing output file ..."
+    # Find groups of flip flops close to each other for multi bit upsets
+    def searchMBUgroups(self, defFile, radius):
+        import defPlacement
 
-    # fill the placeholders with meaning
-    t.datetime = time.strftime('%x %X %Z')
-    t.packageName = splitext(basename(_outFile.name))[0]
-    t.nFF = len(_verilogInstanceStrings)
-    t.flipflops = _verilogInstanceStrings
-    t.flipflops_SEU = [ff[:-1] + "SEU" for ff in _verilogInstanceStrings]
+        if self.verbose > 0:
+            print "Reading placement from {0} ...".format(defFile)
+        placement = defPlacement.readDEF(defFile)
+        positions = [placement.get(defPlacement.normalizeName(name)) for path, name in self.iterInstances()]
+        nPlaced = len(positions) - positions.count(None)
 
-    # write the file
-    _outFile.write(str(t))
-    _outFile.close()
+        self.MBUgroups = defPlacement.findClusters(positions, radius)
 
-    if _verbose > 0:
-        print "File {0} with {1} kB written.".format(_outFile.name, getsize(_outFile.name)/1024)
-
-
-# How the program is intended to use
-def printUsage():
-    print "Usage: fliflopfinder.py <verilog_project> <output_file> <toplevel_name>"
-    print ""
-    print "Parameter:"
-    print "  output_file        Into which file should we save the result?"
-    print "  verilog_project    The path to the verilog file conaining the project after"
-    print "                     synthesis."
-    print "  toplevel_name      The name used in the testbench to instantiate the top level."
-    print ""
-    print "For the output a template file is needed. Currently it is set to this file:"
-    print "  '{0}'".format(_templateFile)
-    print "Make sure that it exists. If you want to change this filename, see the configuration"
-    print "section in this python script."
-    sys.exit()
+        if self.verbose > 0:
+            print "  {0} of {1} flip flops are placed.".format(nPlaced, len(positions))
+            print "  found {0} MBU groups within {1} um.\n".format(len(self.MBUgroups), radius)
+
+
+    def saveToOutput(self, filename, schedule=False):
+        from Cheetah.Template import Template
+
+        t = Template(file=self.templateFile)
+
+        if self.verbose > 0:
+            print "Writing output file ..."
+
+        # fill the placeholders with meaning
+        t.datetime = time.strftime('%x %X %Z')
+        t.packageName = splitext(basename(filename))[0]
+        t.nFF = self.nFF
+        t.flipflops = InstancePaths(self)
+        t.flipflops_SEU = InstancePaths(self, "SEU")
+        t.mbuGroups = self.MBUgroups
+        t.mbuGroupStart = [0]
+        for group in self.MBUgroups:
+            t.mbuGroupStart.append(t.mbuGroupStart[-1] + len(group))
+        t.mbuMembers = [ff for group in self.MBUgroups for ff in group]
+        # run_SEU_schedule only if a schedule is written for it
+        t.schedule = schedule
+
+        # write the file while the template is filled
+        outFile = open(filename, 'w', 1 << 16)
+        t.respond(FileTransaction(outFile))
+        outFile.close()
+
+        if self.verbose > 0:
+            print "File {0} with {1} kB written.".format(filename, getsize(filename)/1024)
+
+
+    # Write a schedule of many injections for run_SEU_schedule in the package
+    def saveSchedule(self, filename, nInjections=None, window=100, seed=None):
+        import injectionSchedule
+
+        schedule = injectionSchedule.makeSchedule(self.nFF, nInjections, window, seed)
+        injectionSchedule.writeSchedule(filename, schedule,
+            "SEU injection schedule for {0}, generated on {1}".format(self.topLevelName, time.strftime('%x %X %Z')))
+
+        if self.verbose > 0:
+            print "Schedule {0} with {1} injections written.".format(filename, len(schedule))
+
+
+    # Write the flip flops into a table for other programs, see fftable.py
+    def saveTable(self, filename):
+        import fftable
+
+        nFF = fftable.writeTable(filename, ((verilogString, FFtype, moduleName)
+            for moduleName, FFtype, verilogString, placementName in self.iterFlipFlops()))
+
+        if self.verbose > 0:
+            print "Table {0} with {1} flip flops and {2} kB written.".format(filename, nFF, getsize(filename)/1024)
+
+
+    # All steps from the netlist to the VHDL package
+    def run(self, inFile, outFile, defFile=None, mbuRadius=5.0, scheduleFile=None, nInjections=None, window=100, seed=None,
+            tableFile=None):
+        self.parseFile(inFile)
+        if defFile:
+            self.searchMBUgroups(defFile, mbuRadius)
+        self.saveToOutput(outFile, bool(scheduleFile))
+        if scheduleFile:
+            self.saveSchedule(scheduleFile, nInjections, window, seed)
+        if tableFile:
+            self.saveTable(tableFile)
+        return self
+
+
+# Process one netlist. A job is a tuple of input file, output file and top level
+# name. Returns the input file and the number of flip flops found.
+def processNetlist(job, verbose=0):
+    inFile, outFile, topLevelName = job
+    finder = FlipFlopFinder(topLevelName, verbose=verbose).run(inFile, outFile)
+    return inFile, finder.nFF
+
+
+# Process many netlists, with a pool of worker processes if processes is not 1.
+# Processes = None uses one worker per CPU.
+def processNetlists(jobs, processes=None):
+    if processes == 1:
+        return [processNetlist(job) for job in jobs]
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(processNetlist, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Read the jobs for batch processing: one netlist per line with the input file,
+# output file and top level name separated by white space
+def readJobFile(filename):
+    jobs = []
+    jobFile = open(filename, 'r')
+    for line in jobFile:
+        line = line.split('#')[0].split()
+        if len(line) == 3:
+            jobs.append(tuple(line))
+    jobFile.close()
+    return jobs
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Search a synthesized verilog project for flip flops and write "
+                    "a VHDL package to simulate single event upsets in them.",
+        epilog="For the output a template file is needed. Currently it is set to "
+               "'{0}', which is searched in the working directory and then next to this "
+               "script. If you want to change this filename, see the configuration "
+               "section in this python script.".format(_templateFile))
+    parser.add_argument("verilog_project", nargs="?", help="The path to the verilog file containing the project after synthesis.")
+    parser.add_argument("output_file", nargs="?", help="Into which file should we save the result?")
+    parser.add_argument("toplevel_name", nargs="?", help="The name used in the testbench to instantiate the top level.")
+    parser.add_argument("--def", dest="defFile", metavar="DEF_FILE",
+                        help="Placement of the design, used to find multi bit upset groups.")
+    parser.add_argument("--mbu-radius", dest="mbuRadius", type=float, default=5.0, metavar="UM",
+                        help="Flip flops within this distance (in microns) form a multi bit "
+                             "upset group. Default: %(default)s")
+    parser.add_argument("--schedule", metavar="SCHEDULE_FILE",
+                        help="Also write a schedule of injections with random timing for "
+                             "run_SEU_schedule, to test many flip flops in one simulation.")
+    parser.add_argument("--injections", type=int, default=None, metavar="N",
+                        help="Number of injections in the schedule. Default: every flip flop once")
+    parser.add_argument("--window", type=int, default=100, metavar="CYCLES",
+                        help="The injections happen randomly within this many clock cycles "
+                             "after the reset. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the random schedule, to get the same one again.")
+    parser.add_argument("--table", metavar="TABLE_FILE",
+                        help="Also write the flip flops into a binary table, to look up the "
+                             "path of an ID and the other way round (see fftable.py).")
+    parser.add_argument("--batch", metavar="JOB_FILE",
+                        help="Process many netlists. Each line of the file has the three "
+                             "parameters above for one netlist.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes for --batch. Default: one per CPU")
+    parser.add_argument("--count", action="store_true",
+                        help="Only print the number of flip flops. No output file and "
+                             "top level name are needed.")
+    parser.add_argument("--list", action="store_true",
+                        help="Only print the paths of the flip flops, one per line. No output "
+                             "file is needed: %(prog)s <verilog_project> <toplevel_name> --list")
+    parser.add_argument("-0", "--null", action="store_true",
+                        help="Separate the paths of --list with NUL characters instead of new lines.")
+    args = parser.parse_args()
+
+    # no output file for listing and counting, the second argument is the top level
+    if (args.count or args.list) and args.toplevel_name is None:
+        args.toplevel_name = args.output_file
+        args.output_file = None
+    if args.list and args.toplevel_name is None:
+        parser.error("--list needs the top level name")
+    if not (args.batch or args.count or args.list) and args.toplevel_name is None:
+        parser.error("too few arguments")
+    if args.mbuRadius <= 0:
+        parser.error("--mbu-radius must be positive")
+    if args.window <= 0:
+        parser.error("--window must be at least one clock cycle")
+    return args
 
 
 # The main program
 def main():
-    if len(sys.argv) != 4:
-        printUsage()
+    args = parseArguments()
+
+    # only count or list the flip flops, the output is meant for other programs
+    if args.count or args.list:
+        finder = FlipFlopFinder(args.toplevel_name or "", verbose=0)
+        finder.parseFile(args.verilog_project)
+        if args.count:
+            sys.stdout.write("{0}\n".format(finder.nFF))
+        else:
+            end = "\0" if args.null else "\n"
+            sys.stdout.writelines(path + end for path, placementName in finder.iterInstances())
+        return
 
-    setInputFile(sys.argv[1])
-    setOutputFile(sys.argv[2])
-    setTopLevelName(sys.argv[3])
+    if args.batch:
+        for inFile, nFF in processNetlists(readJobFile(args.batch), args.jobs):
+            if _verbose > 0:
+                print "{0}: {1} flip flops".format(inFile, nFF)
+        return
 
-    parseFile()
-    searchFlipFlops()
-    buildInstanceList()
+    if _verbose > 0:
+        print "Input file:  " + args.verilog_project
+        print "Output file:  " + args.output_file
+        print "Top Level Instance Name:  " + args.toplevel_name
 
-    saveToOutput()
+    finder = FlipFlopFinder(args.toplevel_name)
+    finder.run(args.verilog_project, args.output_file, args.defFile, args.mbuRadius,
+               args.schedule, args.injections, args.window, args.seed, args.table)
 
 if __name__ == '__main__':
     main()
@@ -24,10 +24,30 @@
 -- #   seu_FF:        An optional flag, indication if a modified std_cell with
 -- #                  a SEU register for switching the value should be used.
 --
+#if $schedule
+-- # To test many flip flops in one simulation run, write a schedule with the
+-- # --schedule option of flipflopfinder and run it in a process:
+-- run_SEU_schedule( "schedule.txt", seu_active, nreset, observe, ff_id, clk, clk_period );
+--
+-- # Before every injection the design is reset (nreset low for n_reset clock
+-- # cycles, default 2), then the flip flop of the schedule is flipped at the
+-- # given cycle and phase and afterwards observe is high for n_observe cycles
+-- # (default 100), while ff_id tells which flip flop was flipped. Check the
+-- # outputs of the design during this time.
+--
+#end if
+#if $mbuGroups
+-- # Multi bit upsets in groups of neighbouring flip flops work the same way:
+-- sim_MBU_FF( MBU_group_to_test, SEU_active, clk, clk_period, seu_FF );
+--
+#end if
 
 library ieee;
 use ieee.std_logic_1164.all;
 use ieee.numeric_std.all;
+#if $schedule
+use std.textio.all;
+#end if
 
 -- we want to change signals inside the hierachy, not only the top module
 -- (only works with cadence tools)
@@ -49,6 +69,22 @@ package $packageName is
     constant seu_FF : in  std_logic := '0'  -- use the modified std_cells with SEU flag
   );
 
+#if $schedule
+  -- Simulate all single event upsets of a schedule file, one after the other
+  procedure run_SEU_schedule (
+    constant filename  : in  string;            -- schedule written by flipflopfinder
+    signal   seu       : out std_logic;         -- SEU active
+    signal   nreset    : out std_logic;         -- reset before every injection
+    signal   observe   : out std_logic;         -- high while the result of an injection is observed
+    signal   ff_id     : out integer;           -- the flip flop of the current injection
+    signal   clk       : in  std_logic;         -- clock
+    constant clk_p     : in  time;              -- clock period
+    constant n_reset   : in  natural := 2;      -- clock cycles in reset, 0: no reset
+    constant n_observe : in  natural := 100;    -- clock cycles to observe after an injection
+    constant seu_FF    : in  std_logic := '0'   -- use the modified std_cells with SEU flag
+  );
+
+#end if
   -- Produce the acutal glitch
   procedure produce_SEU_glitch (
     constant src : in string;           -- the source we are testing
@@ -58,6 +94,36 @@ package $packageName is
 
   -- get a flip flop name and path by its ID
   function getFlipFlop( n : in integer; seu_FF : in std_logic := '0' ) return string;
+#if $mbuGroups
+
+  -- Groups of flip flops placed close to each other (multi bit upsets). The
+  -- flip flop IDs of group n are MBU_GROUP_MEMBERS(MBU_GROUP_START(n)) to
+  -- MBU_GROUP_MEMBERS(MBU_GROUP_START(n+1)-1).
+  type integer_array is array (natural range <>) of integer;
+  constant N_MBU_GROUPS       : integer := $len($mbuGroups);
+  constant N_MBU_MEMBERS      : integer := $len($mbuMembers);
+  constant MBU_GROUP_START    : integer_array(0 to N_MBU_GROUPS) := (
+    #for $i, $start in enumerate($mbuGroupStart)
+    $i => $start,
+    #end for
+    others => 0
+  );
+  constant MBU_GROUP_MEMBERS  : integer_array(0 to N_MBU_MEMBERS-1) := (
+    #for $i, $ff in enumerate($mbuMembers)
+    $i => $ff,
+    #end for
+    others => 0
+  );
+
+  -- Simulate a multi bit upset for a group of flip flops
+  procedure sim_MBU_FF (
+    constant grp    : in  integer range 0 to N_MBU_GROUPS-1; -- which group to use?
+    signal   seu    : out std_logic;        -- SEU active
+    signal   clk    : in  std_logic;        -- clock
+    constant clk_p  : in  time;             -- clock period
+    constant seu_FF : in  std_logic := '0'  -- use the modified std_cells with SEU flag
+  );
+#end if
 end;
 
 package body $packageName is
@@ -97,6 +163,89 @@ package body $packageName is
   end procedure;
 
 
+#if $schedule
+  -- Simulate all single event upsets of a schedule file, one after the other
+  procedure run_SEU_schedule (
+    constant filename  : in  string;            -- schedule written by flipflopfinder
+    signal   seu       : out std_logic;         -- SEU active
+    signal   nreset    : out std_logic;         -- reset before every injection
+    signal   observe   : out std_logic;         -- high while the result of an injection is observed
+    signal   ff_id     : out integer;           -- the flip flop of the current injection
+    signal   clk       : in  std_logic;         -- clock
+    constant clk_p     : in  time;              -- clock period
+    constant n_reset   : in  natural := 2;      -- clock cycles in reset, 0: no reset
+    constant n_observe : in  natural := 100;    -- clock cycles to observe after an injection
+    constant seu_FF    : in  std_logic := '0'   -- use the modified std_cells with SEU flag
+  ) is
+    file     schedule       : text;
+    variable l              : line;
+    variable src            : integer;
+    variable cycle          : integer;
+    variable phase          : integer;
+    variable flipped_signal : string( 1 to 3 );
+  begin
+    seu <= '0';
+    observe <= '0';
+    nreset <= '1';
+    file_open(schedule, filename, read_mode);
+
+    while not endfile(schedule) loop
+      readline(schedule, l);
+      -- skip empty lines and comments
+      next when l'length = 0;
+      next when l(l'low) = '#';
+      read(l, src);
+      read(l, cycle);
+      read(l, phase);
+      ff_id <= src;
+
+      -- start from a known state
+      if n_reset > 0 then
+        nreset <= '0';
+        for i in 1 to n_reset loop
+          wait until rising_edge(clk);
+        end loop;
+        nreset <= '1';
+      end if;
+
+      -- the time of the upset: a clock edge and the phase after it
+      for i in 0 to cycle loop
+        wait until rising_edge(clk);
+      end loop;
+      if seu_FF = '1' then
+        -- the flip flop itself is flipped, at any time
+        wait for clk_p * phase / 1000;
+      else
+        -- the D input is forced, so the glitch has to be on the next rising
+        -- edge like in sim_SEU_FF; the phase is not used
+        wait for (clk_p - duration_glitch/2);
+      end if;
+
+      if seu_FF = '1' then
+        flipped_signal := "'b1";
+      elsif flipflop_mirror(src) = '1' then
+        flipped_signal := "'b0";
+      else
+        flipped_signal := "'b1";
+      end if;
+
+      seu <= '1';
+      produce_SEU_glitch(getFlipFlop(src, seu_FF), flipped_signal);
+      seu <= '0';
+
+      -- let the testbench look at what the upset did
+      observe <= '1';
+      for i in 1 to n_observe loop
+        wait until rising_edge(clk);
+      end loop;
+      observe <= '0';
+    end loop;
+
+    file_close(schedule);
+  end procedure;
+
+
+#end if
   -- Produce the acutal glitch
   procedure produce_SEU_glitch (
     constant src : in string;           -- the source we are testing
@@ -122,8 +271,8 @@ package body $packageName is
     if seu_FF = '1' then
       -- the variant with the modified std_cell, that has a SEU flag inside the FF
       case n is
-        #for $ff in $flipflops_SEU
-        when $flipflops_SEU.index($ff) => return "$ff";
+        #for $i, $ff in enumerate($flipflops_SEU)
+        when $i => return "$ff";
         #end for
         when others => return "NOT FOUND";
       end case;
@@ -134,11 +283,58 @@ package body $packageName is
     else
       -- the default version, without the additional SEU flag
       case n is
-        #for $ff in $flipflops
-        when $flipflops.index($ff) => return "$ff";
+        #for $i, $ff in enumerate($flipflops)
+        when $i => return "$ff";
         #end for
         when others => return "NOT FOUND";
       end case;
     end if;
   end getFlipFlop;
+#if $mbuGroups
+
+
+  -- Simulate a multi bit upset for a group of flip flops
+  procedure sim_MBU_FF (
+    constant grp    : in  integer range 0 to N_MBU_GROUPS-1; -- which group to use?
+    signal   seu    : out std_logic;        -- SEU active
+    signal   clk    : in  std_logic;        -- clock
+    constant clk_p  : in  time;             -- clock period
+    constant seu_FF : in  std_logic := '0'  -- use the modified std_cells with SEU flag
+  ) is
+    variable ff             : integer;
+    variable flipped_signal : string( 1 to 3 );
+  begin
+    seu <= '0';
+
+    wait until rising_edge(clk);
+    if seu_FF = '1' then
+      -- make the SEU appear in the middle of the high phase
+      wait for clk_p/4;
+    else
+      -- make the SEU appear on a rising edge of the clock
+      wait for (clk_p - duration_glitch/2);
+    end if;
+
+    -- flip all flip flops of the group at the same time
+    seu <= '1';
+    for i in MBU_GROUP_START(grp) to MBU_GROUP_START(grp+1)-1 loop
+      ff := MBU_GROUP_MEMBERS(i);
+      if seu_FF = '1' then
+        flipped_signal := "'b1";
+      elsif flipflop_mirror(ff) = '1' then
+        flipped_signal := "'b0";
+      else
+        flipped_signal := "'b1";
+      end if;
+      nc_force( source => getFlipFlop(ff, seu_FF), value => flipped_signal, verbose => "" );
+    end loop;
+
+    wait for duration_glitch;
+
+    for i in MBU_GROUP_START(grp) to MBU_GROUP_START(grp+1)-1 loop
+      nc_release( source => getFlipFlop(MBU_GROUP_MEMBERS(i), seu_FF), keepvalue => "", verbose => "" );
+    end loop;
+    seu <= '0';
+  end procedure;
+#end if
 end package body;
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Injection schedule for many SEUs in one simulation
+#   ----------------------------------------------------
+#
+#  Description: Starting the simulator for every single flip flop costs more
+#               time than the simulation itself (elaboration, licenses). This
+#               writes a schedule of many injections instead, which is executed
+#               by run_SEU_schedule in the generated VHDL package within one
+#               simulation run. Between two injections the design is reset
+#               and/or observed for some clock cycles.
+#
+#               The schedule is a text file, read with textio. After comment
+#               lines starting with '#' there is one injection per line:
+#                 <FF ID> <cycle> <phase>
+#               cycle: rising clock edges to wait after the reset
+#               phase: time after this clock edge in 1/1000 of the clock period
+#               Cycles and phases are random, so the upsets hit the design in
+#               all states and at all times within a clock period.
+#               The phase only applies to the modified std_cells with SEU flag
+#               (seu_FF = '1'). If the D input is forced instead, the glitch
+#               always sits on the next rising edge, otherwise it would not be
+#               sampled; then only the cycle is random.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import random
+
+
+# the phase is given in steps of 1/_phaseSteps of the clock period
+_phaseSteps = 1000
+
+
+# Plan the injections: every flip flop once in random order, or nInjections
+# injections which go through all flip flops again and again. Returns a list
+# of (FF ID, cycle, phase) with cycles from 0 to window-1.
+def makeSchedule(nFF, nInjections=None, window=100, seed=None):
+    if window <= 0:
+        raise ValueError("the window must be at least one clock cycle, not {0}".format(window))
+    if nInjections is None:
+        nInjections = nFF
+    rand = random.Random(seed)
+
+    ffIDs = []
+    while len(ffIDs) < nInjections and nFF > 0:
+        permutation = range(nFF)
+        rand.shuffle(permutation)
+        ffIDs.extend(permutation[:nInjections - len(ffIDs)])
+
+    return [(ff, rand.randrange(window), rand.randrange(_phaseSteps)) for ff in ffIDs]
+
+
+def writeSchedule(filename, schedule, header=None):
+    outFile = open(filename, 'w')
+    if header:
+        outFile.write("".join("# {0}\n".format(line) for line in header.splitlines()))
+    outFile.write("# FF_ID cycle phase/{0}\n".format(_phaseSteps))
+    outFile.write("".join("{0} {1} {2}\n".format(*injection) for injection in schedule))
+    outFile.close()
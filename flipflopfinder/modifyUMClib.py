@@ -1,151 +1,456 @@
 #!/usr/bin/python
 # -*- coding: utf-8
 
+# ------------------------------------------------------------------------------
+#
+#    Add a SEU flag to the flip flops of a standard cell library
+#   -------------------------------------------------------------
+#
+#  Description: Copies a verilog standard cell library and inserts a SEU
+#               register into every flip flop cell, which inverts the output of
+#               the flip flop while it is set by nc_force (see README).
+#               What to change in a cell is described by a rule set for each
+#               technology (UMC and IBM). The input can be a single library
+#               file or a directory with one file per cell; directories are
+#               processed by several worker processes.
+#
+#               UMC cells are changed line by line like by the original parser.
+#               Only two things differ, both on broken cells: a cell without a
+#               known clock port or without the header line is copied
+#               unchanged, and the parser never continues beyond the
+#               `endcelldefine of a cell.
+#
+#  Revisions:
+#    1.0 Initial revision
+#    1.1 Rule sets for UMC and IBM, one regular expression per state,
+#        buffered output, directories in parallel
+#    1.2 Skip cells which are already patched, incremental mode with a
+#        manifest of the content hashes of all cells
+#
+# ------------------------------------------------------------------------------
+
 import sys          # system functions (like exit)
+import os           # directory handling
 import time         # time functions
 import re           # regular expressions
-from os.path import getsize     # some useful functions for filenames
-from pprint import pprint                           # nice print (used for debug)
+import argparse     # command line options
+import hashlib      # content hashes of the cells
+import json         # manifest file
+from os.path import getsize, isdir, join, exists, basename     # some useful functions for filenames
 
 # initialize global values
-_inFile = None
-_outFile = None
 _verbose = 2
 
-_FFcellsUMC = ['DFCM', 'DFCQM', 'DFCQRSM', 'DFCRSM', 'DFEM', 'DFEQM', 'DFEQRM', 'DFEQZRM', 'DFERM', 'DFEZRM', 'DFM', 'DFMM', 'DFMQM', 'DFQM', 'DFQRM', 'DFQRSM', 'DFQSM', 'DFQZRM', 'DFRM', 'DFRSM', 'DFSM', 'DFZRM']
-
-# some regular expressions
-_reModuleBegin = re.compile("`celldefine")
-_reModuleName = re.compile("module [S]?(?P<type>[A-Z]+)[1248]{1}NM\$func\((?P<ports>[a-zA-Z0-9,_ ]+)\)")
-_reEndOfHeader = re.compile("input notifier;")
-_reCLKnegation = re.compile("not MGM_BG_\d{1}")
-_reOutputBuf = re.compile("buf MGM_BG_\d{1}\([BINQ,]+\)")
-_reOutputBufSig = re.compile("(IQ[N]?)")
-_reModuleEnd = re.compile("`endcelldefine")
-
+# size of the file buffers and how many lines are collected before writing
+_bufferSize = 1 << 20
+_linesPerWrite = 4096
 
+_FFcellsUMC = ['DFCM', 'DFCQM', 'DFCQRSM', 'DFCRSM', 'DFEM', 'DFEQM', 'DFEQRM', 'DFEQZRM', 'DFERM', 'DFEZRM', 'DFM', 'DFMM', 'DFMQM', 'DFQM', 'DFQRM', 'DFQRSM', 'DFQSM', 'DFQZRM', 'DFRM', 'DFRSM', 'DFSM', 'DFZRM']
+_FFcellsIBM = ['DFF', 'DFFR', 'DFFS', 'DFFSR', 'SDFF', 'SDFFR', 'SDFFS', 'SDFFSR']
+
+
+# What has to be changed in the flip flop cells of a technology:
+#   cells       names of the flip flop cells
+#   begin       if set, the module header has to follow right after this line
+#   module      module header of a cell, with the groups 'type' and 'ports'
+#   end         the end of a cell, no lines are changed after it
+#   clocks      list of (port, clock signal, line to wait for before inserting)
+#   header      the line after which the SEU block is inserted
+#   output      the lines driving the outputs of the cell ...
+#   outputSig   ... and how their flip flop signal is replaced
+#   skipNext    the line after the SEU block and after every changed output
+#               line is copied unchanged (like the original UMC parser, which
+#               only changed the first of two output buffers in a row)
+#   insert      the SEU block, {date} and {clock} are filled in
+_rules = {
+    'UMC': {
+        'cells': _FFcellsUMC,
+        'begin': "`celldefine",
+        'module': "module [S]?(?P<type>[A-Z]+)[1248]{1}NM\$func\((?P<ports>[a-zA-Z0-9,_ ]+)\)",
+        'end': "`endcelldefine",
+        'clocks': [('CK', 'CK', None), ('CKB', 'MGM_CLK', "not MGM_BG_\d{1}")],
+        'header': "input notifier;",
+        'output': "buf MGM_BG_\d{1}\([BINQ,]+\)",
+        'outputSig': ("(IQ[N]?)", "\g<1>2"),
+        'skipNext': True,
+        'insert': "\n"
+                  "  // [SEU Insert {date}] Added SEU flag, set to 1 by nc_force\n"
+                  "  reg SEU = 1'b0;\n"
+                  "  always @(posedge {clock}) begin\n"
+                  "    SEU <= 1'b0;\n"
+                  "  end\n"
+                  "\n"
+                  "  // [SEU Insert {date}] An intermediate signal which is switched if SEU is high\n"
+                  "  wire IQ, IQ2, IQN, IQN2;\n"
+                  "  assign IQ2 = (SEU) ? ~IQ : IQ;\n"
+                  "  assign IQN2 = (SEU) ? ~IQN : IQN;\n",
+    },
+    'IBM': {
+        'cells': _FFcellsIBM,
+        'begin': None,
+        'module': "module (?P<type>[A-Z]+)(?:_\w+)?\s*\((?P<ports>[a-zA-Z0-9,_ ]+)\)",
+        'end': "^\s*endmodule",
+        'clocks': [('CLK', 'CLK', None), ('CK', 'CK', None)],
+        'header': "^\s*DFF_\w+\s+\w+\s*\(",
+        'output': "^\s*(?:buf|not)\s+\w+\s*\([^)]*\\bqout\\b",
+        'outputSig': ("\\b(qout)\\b", "\g<1>2"),
+        'skipNext': False,
+        'insert': "\n"
+                  "  // [SEU Insert {date}] Added SEU flag, set to 1 by nc_force\n"
+                  "  reg SEU = 1'b0;\n"
+                  "  always @(posedge {clock}) begin\n"
+                  "    SEU <= 1'b0;\n"
+                  "  end\n"
+                  "\n"
+                  "  // [SEU Insert {date}] An intermediate signal which is switched if SEU is high\n"
+                  "  wire qout2;\n"
+                  "  assign qout2 = (SEU) ? ~qout : qout;\n",
+    },
+}
+
+_reModuleName = re.compile("^\s*module\s+(?P<name>[^\s(]+)", re.MULTILINE)
+_cellBegin = "`celldefine"
+_cellEnd = "`endcelldefine"
+
+# cells containing this are already patched
+_markerSEU = "[SEU Insert"
+
+# name of the manifest in the output directory
+_manifestFile = ".seu_manifest.json"
+
+
+# Prepare the regular expressions of a rule set. Every state of the parser has
+# a single regular expression; the name of the matching group tells what was
+# found.
+def compileRules(technology):
+    rule = dict(_rules[technology])
+    rule['name'] = technology
+    rule['module'] = re.compile(rule['module'])
+    rule['outputSig'] = (re.compile(rule['outputSig'][0]), rule['outputSig'][1])
+    rule['dispatch'] = {
+        'foundFF': re.compile("(?P<header>{0})|(?P<end>{1})".format(rule['header'], rule['end'])),
+        'waitForBuf': re.compile("(?P<output>{0})|(?P<end>{1})".format(rule['output'], rule['end'])),
+    }
+    for port, clock, waitFor in rule['clocks']:
+        if waitFor:
+            rule['dispatch']['waitForCLK_' + clock] = re.compile("(?P<clock>{0})|(?P<end>{1})".format(waitFor, rule['end']))
+    return rule
+
+
+# Inserts the SEU flag into the flip flop cells of a piece of a library
+class CellPatcher(object):
+    def __init__(self, technologies=None, date=None):
+        self.rules = [compileRules(tech) for tech in (technologies or sorted(_rules))]
+        self.begins = [rule['begin'] for rule in self.rules if rule['begin']]
+        self.date = date or time.strftime('%Y-%m-%d')
+        self.outputComment = "  // [SEU Insert {0}] Changed input for buffer\n".format(self.date)
+
+    # Returns the modified lines and the number of modified cells
+    def patch(self, lines):
+        output = []
+        state = "idle"
+        rule = None
+        insertBlock = ""
+        clockWait = None
+        nCells = 0
+        afterBegin = False
+        skip = False
+
+        for line in lines:
+            if skip:
+                skip = False
+                output.append(line)
+
+            elif state == "idle":
+                output.append(line)
+                if "module" in line:
+                    for r in self.rules:
+                        if r['begin'] and not afterBegin:
+                            continue
+                        m = r['module'].search(line)
+                        if m and m.group('type') in r['cells']:
+                            rule = r
+                            break
+                    else:
+                        m = None
+                    if m:
+                        # which clock drives the flip flop?
+                        ports = [x.strip() for x in m.group('ports').split(',')]
+                        state = "foundFF"
+                        clockWait = None
+                        for port, clock, waitFor in rule['clocks']:
+                            if port in ports:
+                                insertBlock = rule['insert'].format(date=self.date, clock=clock)
+                                clockWait = "waitForCLK_" + clock if waitFor else None
+                                break
+                        else:
+                            # no known clock, leave the cell as it is
+                            state = "idle"
+                        nCells += state == "foundFF"
 
-# Set input and output files
-def setInputFile(filename):
-    global _inFile
-    _inFile = file(filename, 'r')
-    if _verbose > 0:
-        print "Input file:  " + filename
-
-def setOutputFile(filename):
-    global _outFile
-    _outFile = file(filename, 'w')
-    if _verbose > 0:
-        print "Output file:  " + filename
-
-
-def parseFile():
-    global _inFile, _outFile, _nlines
-    state = "idle"
-    nlines = 0
-    CLKname = ""
-
-    for line in _inFile:
-        nlines += 1
-
-        # if nlines < 74000:
-        #     continue
-        # print state + "\t" + line.rstrip()
-
-        if state == "idle":
-            if _reModuleBegin.search(line):
-                state = "begin"
-
-        elif state == "begin":
-            m = _reModuleName.search(line)
-            if m and m.group('type') in _FFcellsUMC:
-                state = "foundFF"
-                ports = [x.strip() for x in m.group('ports').split(',')]
-                if "CK" in ports:
-                    CLKname = "CK"
-                elif "CKB" in ports:
-                    CLKname = "MGM_CLK"
             else:
-                state = "idle"
-
-        elif state == "foundFF":
-            if _reEndOfHeader.search(line):
-                if CLKname == "MGM_CLK":
-                    state = "waitForCLK"
+                m = rule['dispatch'][state].search(line)
+                found = m.lastgroup if m else None
+
+                if found == "end":
+                    state = "idle"
+                    output.append(line)
+                elif found == "header" and clockWait:
+                    state = clockWait
+                    output.append(line)
+                elif found == "header" or found == "clock":
+                    state = "waitForBuf"
+                    output.append(line)
+                    output.append(insertBlock)
+                    skip = rule['skipNext']
+                elif found == "output":
+                    output.append(self.outputComment)
+                    output.append("  //" + line)
+                    output.append(rule['outputSig'][0].sub(rule['outputSig'][1], line))
+                    skip = rule['skipNext']
                 else:
-                    state = "insert"
-
-        elif state == "waitForCLK":
-            if _reCLKnegation.search(line):
-                state = "insert"
-
-        elif state == "insert":
-            state = "waitForBuf"
-
-        elif state == "waitForBuf":
-            if _reModuleEnd.search(line):
-                state = "idle"
-            elif _reOutputBuf.search(line):
-                state = "outputBuf"
-
-        elif state == "outputBuf":
-            state = "waitForBuf"
-
-        # write output
-        if state == "insert":  # additional stuff
-            _outFile.write(line)
-            _outFile.write("\n")
-            _outFile.write("  // [SEU Insert {0}] Added SEU flag, set to 1 by nc_force\n".format(time.strftime('%Y-%m-%d')))
-            _outFile.write("  reg SEU = 1'b0;\n")
-            _outFile.write("  always @(posedge {0}) begin\n".format(CLKname))
-            _outFile.write("    SEU <= 1'b0;\n")
-            _outFile.write("  end\n")
-            _outFile.write("\n")
-            _outFile.write("  // [SEU Insert {0}] An intermediate signal which is switched if SEU is high\n".format(time.strftime('%Y-%m-%d')))
-            _outFile.write("  wire IQ, IQ2, IQN, IQN2;\n")
-            _outFile.write("  assign IQ2 = (SEU) ? ~IQ : IQ;\n")
-            _outFile.write("  assign IQN2 = (SEU) ? ~IQN : IQN;\n")
-
-        elif state == "outputBuf":
-            _outFile.write("  // [SEU Insert {0}] Changed input for buffer\n".format(time.strftime('%Y-%m-%d')))
-            _outFile.write("  //" + line)
-            _outFile.write(_reOutputBufSig.sub("\g<1>2", line))
-
+                    output.append(line)
+
+            afterBegin = any(begin in line for begin in self.begins)
+
+        return output, nCells
+
+
+# Split a library into the `celldefine ... `endcelldefine blocks of the cells
+# and the text between them. Yields (is a cell block, lines).
+def splitCells(lines):
+    segment = []
+    for line in lines:
+        if _cellBegin in line and segment:
+            yield False, segment
+            segment = []
+        segment.append(line)
+        if _cellEnd in line:
+            yield True, segment
+            segment = []
+    if segment:
+        yield False, segment
+
+
+# The name of the (first) module in a piece of verilog code
+def cellName(text):
+    m = _reModuleName.search(text)
+    return m.group('name') if m else None
+
+
+def contentHash(text):
+    return hashlib.sha1(text).hexdigest()
+
+
+# Read a library into a dict with the cell names as keys and the text of their
+# blocks as values
+def readCells(filename):
+    cells = {}
+    libFile = open(filename, 'r', _bufferSize)
+    for isCell, lines in splitCells(libFile):
+        if isCell:
+            text = "".join(lines)
+            cells[cellName(text)] = text
+    libFile.close()
+    return cells
+
+
+def readManifest(filename):
+    if not exists(filename):
+        return {}
+    manifestFile = open(filename, 'r')
+    manifest = json.load(manifestFile)
+    manifestFile.close()
+    return manifest
+
+
+def writeManifest(filename, manifest):
+    manifestFile = open(filename, 'w')
+    json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    manifestFile.close()
+
+
+# Insert the SEU flag into all flip flop cells of a library file.
+#
+# Cells which already contain a SEU insert are copied unchanged, so running the
+# script on its own output does not change anything. With a manifest (a dict
+# with the content hashes of the input and output block of each cell from the
+# last run) the cells which didn't change since then are copied from the
+# previous output file instead of being patched again. The manifest is updated
+# in place. All new or changed cells are also written to deltaName, if given.
+#
+# Returns the number of modified and the number of reused cells.
+def patchFile(inName, outName, technologies=None, date=None, manifest=None, deltaName=None):
+    patcher = CellPatcher(technologies, date)
+    previous = {}
+    if manifest and exists(outName):
+        previous = readCells(outName)
+
+    inFile = open(inName, 'r', _bufferSize)
+    output = []
+    delta = []
+    nCells = 0
+    nReused = 0
+
+    for isCell, lines in splitCells(inFile):
+        text = "".join(lines)
+        name = cellName(text) if isCell else None
+
+        # unchanged since the last run?
+        if name and manifest is not None:
+            inHash = contentHash(text)
+            old = manifest.get(name)
+            if old and old['in'] == inHash and name in previous and contentHash(previous[name]) == old['out']:
+                output.append(previous[name])
+                nReused += 1
+                continue
+
+        # already patched?
+        if _markerSEU in text:
+            patched = text
         else:
-            _outFile.write(line)
-
-        # if nlines > 74027:
-        #     break
-
-
-# How the program is intended to use
-def printUsage():
-    print "Usage: modifyUMClib.py <UMC_library_file> <modified_library>"
-    print ""
-    print "Parameter:"
-    print "  UMC_library_file   The file of the unmodified UMC library, defining the"
-    print "                     standard cells."
-    print "  modified_library   The new library file which is created, including the"
-    print "                     SEU flags inside the cells."
-    sys.exit()
+            patchedLines, n = patcher.patch(lines)
+            patched = "".join(patchedLines)
+            nCells += n
+        output.append(patched)
+
+        if name and manifest is not None:
+            manifest[name] = {'in': inHash, 'out': contentHash(patched)}
+        if name and deltaName:
+            delta.append(patched)
+    inFile.close()
+
+    # the previous output is read completely, so it can be overwritten now
+    outFile = open(outName, 'w', _bufferSize)
+    for i in range(0, len(output), _linesPerWrite):
+        outFile.write("".join(output[i:i+_linesPerWrite]))
+    outFile.close()
+
+    if deltaName:
+        deltaFile = open(deltaName, 'w', _bufferSize)
+        deltaFile.write("".join(delta))
+        deltaFile.close()
+
+    return nCells, nReused
+
+
+def _patchFileJob(job):
+    inName, outName, technologies, date = job
+    nCells = patchFile(inName, outName, technologies, date)[0]
+    outFile = open(outName, 'r', _bufferSize)
+    outHash = contentHash(outFile.read())
+    outFile.close()
+    return inName, nCells, outHash
+
+
+# Patch all files of a library directory, the output directory is created if
+# needed. With a manifest, files which didn't change since the last run are not
+# touched (see patchFile).
+# Returns a list of (filename, number of modified cells) of the files written.
+def patchDirectory(inDir, outDir, technologies=None, processes=None, manifest=None):
+    if not isdir(outDir):
+        os.makedirs(outDir)
+    date = time.strftime('%Y-%m-%d')
+    jobs = []
+    inHashes = {}
+    for name in sorted(os.listdir(inDir)):
+        inName = join(inDir, name)
+        outName = join(outDir, name)
+        if isdir(inName):
+            continue
+        if manifest is not None:
+            inFile = open(inName, 'r', _bufferSize)
+            inHashes[inName] = inHash = contentHash(inFile.read())
+            inFile.close()
+            old = manifest.get(name)
+            if old and old['in'] == inHash and exists(outName):
+                outFile = open(outName, 'r', _bufferSize)
+                unchanged = contentHash(outFile.read()) == old['out']
+                outFile.close()
+                if unchanged:
+                    continue
+        jobs.append((inName, outName, technologies, date))
+
+    if processes == 1 or len(jobs) < 2:
+        results = [_patchFileJob(job) for job in jobs]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_patchFileJob, jobs, chunksize=8)
+        finally:
+            pool.close()
+            pool.join()
+
+    if manifest is not None:
+        for inName, nCells, outHash in results:
+            manifest[basename(inName)] = {'in': inHashes[inName], 'out': outHash}
+    return [(inName, nCells) for inName, nCells, outHash in results]
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Copy a standard cell library and add a SEU flag to all flip flop cells.")
+    parser.add_argument("library", help="The file of the unmodified library defining the standard "
+                                        "cells, or a directory with one file per cell.")
+    parser.add_argument("modified_library", help="The new library file (or directory) which is "
+                                                 "created, including the SEU flags inside the cells.")
+    parser.add_argument("--tech", choices=sorted(_rules), action="append",
+                        help="Only look for the flip flops of this technology. Default: all")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes for a directory. Default: one per CPU")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Only patch the cells which changed since the last run. The content "
+                             "hashes of the cells are kept in <modified_library>.manifest.json (or "
+                             "in {0} in the output directory).".format(_manifestFile))
+    parser.add_argument("--delta", metavar="FILE",
+                        help="Write all new or changed cells into this file, so only these have "
+                             "to be compiled again. For a directory these are the cells of all "
+                             "files written.")
+    return parser.parse_args()
 
 
 # The main program
 def main():
-    global _inFile, _outFile
-    if len(sys.argv) != 3:
-        printUsage()
-
-    setInputFile(sys.argv[1])
-    setOutputFile(sys.argv[2])
-
-    parseFile()
-
-    _inFile.close()
-    _outFile.close()
+    args = parseArguments()
 
     if _verbose > 0:
-        print "File with {0} kB written.".format(getsize(_outFile.name)/1024)
+        print "Input:  " + args.library
+        print "Output:  " + args.modified_library
+
+    if isdir(args.library):
+        manifestName = join(args.modified_library, _manifestFile)
+    else:
+        manifestName = args.modified_library + ".manifest.json"
+    manifest = readManifest(manifestName) if args.incremental else None
+
+    if isdir(args.library):
+        results = patchDirectory(args.library, args.modified_library, args.tech, args.jobs, manifest)
+        if _verbose > 1:
+            for name, nCells in results:
+                if nCells > 0:
+                    print "  {0}: {1} cells modified".format(name, nCells)
+        if _verbose > 0:
+            print "{0} files with {1} modified cells written.".format(len(results), sum(x[1] for x in results))
+        # only new or changed files are written, together they are the delta
+        if args.delta:
+            deltaFile = open(args.delta, 'w', _bufferSize)
+            for name, nCells in results:
+                outFile = open(join(args.modified_library, basename(name)), 'r', _bufferSize)
+                deltaFile.write(outFile.read())
+                outFile.close()
+            deltaFile.close()
+    else:
+        nCells, nReused = patchFile(args.library, args.modified_library, args.tech,
+                                    manifest=manifest, deltaName=args.delta)
+        if _verbose > 0:
+            print "File with {0} kB and {1} modified cells written.".format(getsize(args.modified_library)/1024, nCells)
+            if manifest is not None:
+                print "{0} unchanged cells copied from the last run.".format(nReused)
+
+    if manifest is not None:
+        writeManifest(manifestName, manifest)
 
 
 if __name__ == '__main__':
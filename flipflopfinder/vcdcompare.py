@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Compare the VCD dumps of a golden and a faulty simulation
+#   -----------------------------------------------------------
+#
+#  Description: After a simulation with an SEU (sim_SEU_FF of the package
+#               written by flipflopfinder.py) its outcome is found by comparing
+#               the dump with the one of a simulation without upset (golden):
+#                 masked    no observed signal differs at the end
+#                 latent    no output differs, but some state signal still
+#                           differs at the end of the dump
+#                 detected  a detection signal (like SEU_error) differs before
+#                           or when the first output differs
+#                 failure   an output differs before any detection signal
+#               Both dumps are read line by line in lock-step, only the values
+#               of the observed signals are kept. The comparison stops at the
+#               first difference of an output or detection signal, so for most
+#               failures only the beginning of the dumps is read.
+#
+#               If the signal which is high during the upset (SEU_active) is
+#               given, the latency of the detection or failure is measured from
+#               its first rising edge in the faulty dump.
+#
+#               The reader expects one value change per line, as all common
+#               simulators write it. Dumps ending with .gz are read through
+#               gzip.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import sys
+import gzip
+import fnmatch
+import argparse
+import multiprocessing
+from collections import namedtuple
+
+
+# The outcome of one faulty dump. time is when the outcome was decided (for
+# masked and latent the last time stamp of the longer dump), latency the time
+# since the upset (None without injection signal) and signal the first one
+# which differed.
+Comparison = namedtuple('Comparison', ['faulty', 'outcome', 'time', 'latency', 'signal'])
+
+_outcomes = ['masked', 'latent', 'detected', 'failure']
+
+# the kinds of observed signals
+_output, _detect, _state, _injection = range(4)
+
+_bufferSize = 1 << 20
+
+
+def openDump(filename):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'r', _bufferSize)
+
+
+# Read the header of a dump up to $enddefinitions. Returns the time scale and
+# a dict of the full signal names (scopes separated by '.') with their
+# identifier codes.
+def readHeader(vcdFile):
+    signals = {}
+    scopes = []
+    timescale = ""
+    statement = []
+    for line in vcdFile:
+        for token in line.split():
+            statement.append(token)
+            if token != '$end':
+                continue
+            keyword = statement[0]
+            if keyword == '$scope':
+                scopes.append(statement[2])
+            elif keyword == '$upscope':
+                scopes.pop()
+            elif keyword == '$var':
+                name = statement[4]
+                # a single bit of a vector keeps its index, a range is dropped
+                if len(statement) > 6 and ':' not in statement[5]:
+                    name += statement[5]
+                signals[".".join(scopes + [name])] = statement[3]
+            elif keyword == '$timescale':
+                timescale = " ".join(statement[1:-1])
+            elif keyword == '$enddefinitions':
+                return timescale, signals
+            statement = []
+    raise ValueError("no $enddefinitions in the dump")
+
+
+# A value in a form where equal values compare equal: vectors are written
+# without leading zeros
+def _normalize(value):
+    if value[0] in 'bB':
+        return value[1:].lstrip('0') or '0'
+    return value
+
+
+# Read the value changes of the observed signals. codes is a dict of the
+# identifier codes with the list of indices of the signals using them. Yields
+# the time and the list of (signal index, value) for every time with changes,
+# and last the final time stamp of the dump, with an empty list if nothing
+# changed then.
+def iterChanges(vcdFile, codes):
+    time = 0
+    changes = []
+    for line in vcdFile:
+        first = line[:1]
+        if first in '01xzXZ':
+            code = line[1:].rstrip()
+            if code in codes:
+                for index in codes[code]:
+                    changes.append((index, first))
+        elif first in 'bBrR':
+            value, code = line.split()
+            if code in codes:
+                value = _normalize(value)
+                for index in codes[code]:
+                    changes.append((index, value))
+        elif first == '#':
+            if changes:
+                yield time, changes
+                changes = []
+            time = int(line[1:])
+    yield time, changes
+
+
+# The observed signals: a list of (name, kind) for all signals of the dump
+# matching the patterns. Every signal is observed only once, outputs come
+# first, then detection and state signals.
+def observedSignals(names, outputs, detects, states=(), injection=None):
+    signals = []
+    seen = set()
+    if injection is not None:
+        if injection not in names:
+            raise ValueError("injection signal '{0}' is not in the dump".format(injection))
+        signals.append((injection, _injection))
+        seen.add(injection)
+    for patterns, kind in ((outputs, _output), (detects, _detect), (states, _state)):
+        for pattern in patterns:
+            matches = fnmatch.filter(names, pattern)
+            if not matches:
+                raise ValueError("no signal matches '{0}'".format(pattern))
+            for name in sorted(matches):
+                if name not in seen:
+                    signals.append((name, kind))
+                    seen.add(name)
+    return signals
+
+
+# Map the identifier codes of a dump to the indices of the observed signals
+def signalCodes(header, signals, filename):
+    codes = {}
+    for index, (name, kind) in enumerate(signals):
+        if name not in header:
+            raise ValueError("{0}: signal '{1}' is missing".format(filename, name))
+        codes.setdefault(header[name], []).append(index)
+    return codes
+
+
+# Compare a faulty dump with the golden one. Returns a Comparison.
+def compareDumps(golden, faulty, outputs, detects, states=(), injection=None):
+    goldenFile = openDump(golden)
+    faultyFile = openDump(faulty)
+    try:
+        goldenHeader = readHeader(goldenFile)[1]
+        faultyHeader = readHeader(faultyFile)[1]
+        signals = observedSignals(goldenHeader.keys(), outputs, detects, states, injection)
+        kinds = [kind for name, kind in signals]
+        goldenValues = ['x'] * len(signals)
+        faultyValues = ['x'] * len(signals)
+        steps = [iterChanges(goldenFile, signalCodes(goldenHeader, signals, golden)),
+                 iterChanges(faultyFile, signalCodes(faultyHeader, signals, faulty))]
+        values = [goldenValues, faultyValues]
+        pending = [next(steps[0], None), next(steps[1], None)]
+
+        injectionTime = None
+        different = set()
+        time = 0
+        while pending[0] is not None or pending[1] is not None:
+            time = min(step[0] for step in pending if step is not None)
+            changed = set()
+            for i in (0, 1):
+                if pending[i] is not None and pending[i][0] == time:
+                    for index, value in pending[i][1]:
+                        values[i][index] = value
+                        changed.add(index)
+                    pending[i] = next(steps[i], None)
+
+            outcome = None
+            for index in changed:
+                if kinds[index] == _injection:
+                    if injectionTime is None and faultyValues[index] == '1':
+                        injectionTime = time
+                elif goldenValues[index] != faultyValues[index]:
+                    different.add(index)
+                    if kinds[index] == _detect:
+                        outcome = ('detected', index)
+                    elif kinds[index] == _output and outcome is None:
+                        outcome = ('failure', index)
+                else:
+                    different.discard(index)
+            if outcome is not None:
+                latency = None if injectionTime is None else time - injectionTime
+                return Comparison(faulty, outcome[0], time, latency, signals[outcome[1]][0])
+
+        if different:
+            return Comparison(faulty, 'latent', time, None, signals[min(different)][0])
+        return Comparison(faulty, 'masked', time, None, None)
+    finally:
+        goldenFile.close()
+        faultyFile.close()
+
+
+# A job is (golden, faulty, outputs, detects, states, injection)
+def _compareJob(job):
+    return compareDumps(*job)
+
+
+# Compare many faulty dumps with the golden one, with a pool of worker
+# processes if processes is not 1. The comparisons are yielded as they finish.
+def compareMany(golden, faultyDumps, outputs, detects, states=(), injection=None, processes=None):
+    jobs = [(golden, faulty, outputs, detects, states, injection) for faulty in faultyDumps]
+    if processes == 1:
+        for job in jobs:
+            yield _compareJob(job)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for comparison in pool.imap_unordered(_compareJob, jobs):
+            yield comparison
+    finally:
+        pool.close()
+        pool.join()
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Classify SEU simulations as masked, latent, detected or failure by comparing "
+                    "their VCD dumps with a golden dump.",
+        epilog="Signal names are the full hierarchical names of the dump separated by '.', "
+               "like tb.dut.data_out. Wildcards as in the shell are allowed.")
+    parser.add_argument("golden", help="The dump of the simulation without upset.")
+    parser.add_argument("faulty", nargs="+", help="The dumps of the simulations with upsets.")
+    parser.add_argument("--outputs", nargs="+", required=True, metavar="SIGNAL",
+                        help="The primary outputs. A difference there is a failure.")
+    parser.add_argument("--detect", nargs="+", default=[], metavar="SIGNAL",
+                        help="Signals flagging a detected upset, like SEU_error.")
+    parser.add_argument("--state", nargs="+", default=[], metavar="SIGNAL",
+                        help="Internal signals, if they still differ at the end the upset is latent.")
+    parser.add_argument("--injection", metavar="SIGNAL",
+                        help="The signal which is high during the upset (SEU_active), to measure latencies.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes. Default: one per CPU")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    goldenFile = openDump(args.golden)
+    timescale = readHeader(goldenFile)[0]
+    goldenFile.close()
+    counts = dict((outcome, 0) for outcome in _outcomes)
+    print "# faulty outcome time latency signal  (time in {0})".format(timescale or "?")
+    try:
+        for comparison in compareMany(args.golden, args.faulty, args.outputs, args.detect,
+                                      args.state, args.injection, args.jobs):
+            counts[comparison.outcome] += 1
+            print "{0} {1} {2} {3} {4}".format(comparison.faulty, comparison.outcome, comparison.time,
+                "-" if comparison.latency is None else comparison.latency, comparison.signal or "-")
+            sys.stdout.flush()
+    except ValueError as e:
+        sys.stderr.write("{0}\n".format(e))
+        sys.exit(1)
+    print "# " + ", ".join("{0} {1}".format(counts[outcome], outcome) for outcome in _outcomes)
+
+
+if __name__ == '__main__':
+    main()
@@ -59,13 +59,16 @@
 #   1.0.9 - Enhanced udpInstance to handle identifiers with leading '\' and subscripting
 #   1.0.10 - Fixed change added in 1.0.9 to work for all identifiers, not just those used
 #           for udpInstance.
+#   1.0.11 - Optional profiling of the named grammar rules (GrammarProfiler),
+#           rate limited progress callback instead of writing every module,
+#           parseVerilog() with a final progress report
 #
 # import pdb
-# import time
 # import pprint
 import sys
+import time
 
-__version__ = "1.0.10"
+__version__ = "1.0.11"
 
 from pyparsing import Literal, CaselessLiteral, Keyword, Word, Upcase, OneOrMore, ZeroOrMore, \
         Forward, NotAny, delimitedList, Group, Optional, Combine, alphas, nums, restOfLine, cStyleComment, \
@@ -610,12 +613,36 @@ def Verilog_BNF():
     return verilogbnf
 
 
-def printStatus(s, l, t):
-    progress = float(l) / float(len(s))
-    out = "\rProgress: {0:5.1f}%  ({1:7d} / {2:7d} lines)".format(progress*100, l, len(s))
+# Progress while parsing: after a module, progressCallback(location, length)
+# is called, but at most every progressInterval seconds. None disables it.
+# parseVerilog() always reports the end of the text, once the parse is done.
+def writeProgress(l, length):
+    progress = float(l) / float(length or 1)
+    out = "\rProgress: {0:5.1f}%  ({1:7d} / {2:7d} characters)".format(progress*100, l, length)
     sys.stdout.write(out)
     sys.stdout.flush()
 
+progressCallback = writeProgress
+progressInterval = 0.5
+_lastProgress = [0.0]
+
+def printStatus(s, l, t):
+    if progressCallback is None:
+        return
+    now = time.time()
+    if now - _lastProgress[0] >= progressInterval:
+        _lastProgress[0] = now
+        progressCallback(l, len(s))
+
+
+# Parse a netlist with progress reports, the last one at 100%
+def parseVerilog(text, grammar=None):
+    _lastProgress[0] = 0.0
+    tokens = (grammar or Verilog_BNF()).parseString(text)
+    if progressCallback is not None:
+        progressCallback(len(text), len(text))
+    return tokens
+
 
 def removeUselessStuff(s,l,t):
     # print t
@@ -635,6 +662,105 @@ def removeUselessStuff(s,l,t):
     # print t
     # sys.exit(0)
 
+# Counts and times every named element of a grammar (everything given a name
+# with setName(), and the tokens), using the debug actions of pyparsing:
+#
+#     profiler = GrammarProfiler()
+#     profiler.attach( Verilog_BNF() )
+#     Verilog_BNF().parseString( text )
+#     profiler.detach()
+#     print profiler.report()
+#
+# Elements with the same name are counted together. The time of a rule
+# includes the rules inside it, a recursive rule is timed only at its
+# outermost level. With packrat parsing, the lookups of the parse cache are
+# counted as hits and misses; a hit does not reach the debug actions, so it
+# is no attempt.
+class GrammarProfiler(object):
+    def __init__(self):
+        # by name: [attempts, successes, failures, seconds, cache hits, cache misses]
+        self.stats = {}
+        self.saved = {}
+        self.stack = []
+        self.depth = {}
+        self.originalParse = None
+
+    def _rule(self, name):
+        if name not in self.stats:
+            self.stats[name] = [0, 0, 0, 0.0, 0, 0]
+        return self.stats[name]
+
+    def _start(self, instring, loc, expr):
+        name = expr.name
+        self._rule(name)[0] += 1
+        self.depth[name] = self.depth.get(name, 0) + 1
+        self.stack.append((name, time.time()))
+
+    def _stop(self, column):
+        name, start = self.stack.pop()
+        self.depth[name] -= 1
+        stats = self.stats[name]
+        stats[column] += 1
+        if self.depth[name] == 0:
+            stats[3] += time.time() - start
+
+    def _success(self, instring, startloc, endloc, expr, tokens):
+        self._stop(1)
+
+    def _failure(self, instring, loc, expr, exc):
+        self._stop(2)
+
+    # Instrument all named elements reachable from the grammar
+    def attach(self, grammar):
+        todo = [grammar]
+        seen = set()
+        while todo:
+            expr = todo.pop()
+            if id(expr) in seen:
+                continue
+            seen.add(id(expr))
+            if 'name' in expr.__dict__:
+                self.saved[id(expr)] = (expr, expr.debug, expr.debugActions)
+                expr.setDebugActions(self._start, self._success, self._failure)
+            todo.extend(getattr(expr, 'exprs', []))
+            todo.extend(getattr(expr, 'ignoreExprs', []))
+            if getattr(expr, 'expr', None) is not None:
+                todo.append(expr.expr)
+
+        if ParserElement._packratEnabled and self.originalParse is None:
+            self.originalParse = ParserElement.__dict__['_parse']
+            profiler = self
+            def _parseCounted( self, instring, loc, doActions=True, callPreParse=True ):
+                stats = profiler._rule(self.__dict__.get('name', "(unnamed)"))
+                if (self,instring,loc,callPreParse,doActions) in ParserElement._exprArgCache:
+                    stats[4] += 1
+                else:
+                    stats[5] += 1
+                return profiler.originalParse( self, instring, loc, doActions, callPreParse )
+            ParserElement._parse = _parseCounted
+        return self
+
+    # Remove the instrumentation again, the counts are kept
+    def detach(self):
+        for expr, debug, debugActions in self.saved.values():
+            expr.debug = debug
+            expr.debugActions = debugActions
+        self.saved = {}
+        if self.originalParse is not None:
+            ParserElement._parse = self.originalParse
+            self.originalParse = None
+
+    # The rules ranked by time (or by the column given), as a text table
+    def report(self, limit=30, sortBy=3):
+        ranked = sorted(self.stats.items(), key=lambda item: item[1][sortBy], reverse=True)
+        lines = ["{0:<30} {1:>10} {2:>10} {3:>10} {4:>10} {5:>10} {6:>10}".format(
+            "rule", "attempts", "successes", "failures", "seconds", "hits", "misses")]
+        for name, (attempts, successes, failures, seconds, hits, misses) in ranked[:limit]:
+            lines.append("{0:<30} {1:10d} {2:10d} {3:10d} {4:10.3f} {5:10d} {6:10d}".format(
+                name[:30], attempts, successes, failures, seconds, hits, misses))
+        return "\n".join(lines)
+
+
 # def test( strng ):
 #     tokens = []
 #     try:
@@ -740,3 +866,21 @@ def removeUselessStuff(s,l,t):
 #     #~ main()
 #     #~ p.stop()
 #     #~ p.close()
+
+
+# Profile the grammar on a netlist: which rules take the time?
+#     python verilogParse.py <verilog file> [<number of rules>]
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print "Usage: verilogParse.py <verilog file> [<number of rules>]"
+        sys.exit(1)
+    inFile = open(sys.argv[1], 'r')
+    text = inFile.read()
+    inFile.close()
+
+    profiler = GrammarProfiler().attach(Verilog_BNF())
+    startTime = time.time()
+    tokens = parseVerilog(text)
+    profiler.detach()
+    print "\n{0} modules parsed in {1:.2f} s\n".format(len(tokens), time.time() - startTime)
+    print profiler.report(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Benchmarks of the Hamming and Halo Tools
+#   ------------------------------------------
+#
+#  Description: Measures how fast the Hamming table and halo tools are, to
+#               notice when a change makes them slower:
+#                 - words encoded per second, by HamCode() (the original
+#                   scalar path), HammingCode.encode() and encodeArray()
+#                 - words decoded per second by decodeArray()
+#                 - table rows written per second in every table format
+#                 - halo constant lines written per second
+#               for widths from 4 to 64 bits. Every benchmark runs in a process
+#               of its own, so the growth of the peak memory during the
+#               benchmark can be measured as well. A benchmark whose process
+#               dies is reported as failed.
+#
+#               The results are written as JSON and can be compared with an
+#               earlier run; a benchmark slower than the tolerance is reported
+#               as a regression.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import os
+import sys
+import time
+import json
+import Queue
+import random
+import platform
+import argparse
+import resource
+import multiprocessing
+
+import hamming_table
+from hamming_table import HammingCode, numpy
+import vhdl_halo_constant
+
+
+_defaultWidths = [4, 8, 16, 32, 48, 64]
+
+# every benchmark runs at least this many seconds
+_minTime = 0.5
+
+# the full table is only written up to this signal length
+_maxTableBits = 16
+
+# how many words are encoded or decoded by one call of the batch functions
+_batchWords = 1 << 16
+
+
+def randomWords(nBits, count, seed=1):
+    rand = random.Random(seed)
+    return [rand.getrandbits(nBits) for i in range(count)]
+
+
+# The benchmarks: each one gets the width and returns the function to time
+# and how many words or rows it handles per call, or None if it does not
+# apply to this width.
+def benchHamCode(width):
+    hamming_table.nSignalBits = width
+    hamming_table.nParityBits = hamming_table.ParityBits()
+    hamming_table.nTotalBits = width + hamming_table.nParityBits
+    words = randomWords(width, 1000)
+    return lambda: [hamming_table.HamCode(word) for word in words], len(words)
+
+
+def benchEncode(width):
+    code = HammingCode(width)
+    words = randomWords(width, 1000)
+    return lambda: [code.encode(word) for word in words], len(words)
+
+
+def benchEncodeArray(width):
+    code = HammingCode(width)
+    if not code.useNumpy:
+        return None
+    words = numpy.array(randomWords(width, _batchWords), dtype=numpy.uint64)
+    return lambda: code.encodeArray(words), len(words)
+
+
+def benchDecodeArray(width):
+    code = HammingCode(width)
+    if not code.useNumpy:
+        return None
+    encoded = code.encodeArray(numpy.array(randomWords(width, _batchWords), dtype=numpy.uint64))
+    encoded ^= numpy.uint64(1) << numpy.array(randomWords(5, _batchWords), dtype=numpy.uint64) % numpy.uint64(code.nTotalBits)
+    return lambda: code.decodeArray(encoded), len(encoded)
+
+
+def benchTable(outFormat):
+    def bench(width):
+        if width > _maxTableBits:
+            return None
+        code = HammingCode(width)
+        outFile = open(os.devnull, 'wb')
+        return lambda: hamming_table._writers[outFormat](code, outFile), 2**width
+    return bench
+
+
+def benchHalo(distance):
+    def bench(width):
+        rand = random.Random(1)
+        states = [("S{0}".format(i), "{0:0{1}b}".format(rand.getrandbits(width), width)) for i in range(16)]
+        nLines = sum(1 for line in vhdl_halo_constant.HaloLines(states, distance))
+        outFile = open(os.devnull, 'w')
+        return lambda: vhdl_halo_constant.WriteLines(vhdl_halo_constant.HaloLines(states, distance), outFile), nLines
+    return bench
+
+
+# name, function, unit
+_benchmarks = [
+    ('HamCode',       benchHamCode,       'words/s'),
+    ('encode',        benchEncode,        'words/s'),
+    ('encodeArray',   benchEncodeArray,   'words/s'),
+    ('decodeArray',   benchDecodeArray,   'words/s'),
+    ('table text',    benchTable('text'), 'rows/s'),
+    ('table bin',     benchTable('bin'),  'rows/s'),
+    ('table memh',    benchTable('memh'), 'rows/s'),
+    ('table vhdl',    benchTable('vhdl'), 'rows/s'),
+    ('halo 1',        benchHalo(1),       'lines/s'),
+    ('halo 2',        benchHalo(2),       'lines/s'),
+]
+
+
+# Call the function again and again for at least minTime seconds. Returns the
+# items per second.
+def measure(function, nItems, minTime=_minTime):
+    function()
+    nCalls = 0
+    start = time.time()
+    elapsed = 0.0
+    while elapsed < minTime:
+        function()
+        nCalls += 1
+        elapsed = time.time() - start
+    return nCalls * nItems / elapsed
+
+
+# Run one benchmark in this process and put the result into the queue. The
+# forked process starts with the peak memory of its parent, so only the growth
+# of the peak during the benchmark is reported.
+def runBenchmark(name, width, minTime, queue):
+    startPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    setup = dict((b[0], b[1]) for b in _benchmarks)[name]
+    bench = setup(width)
+    if bench is None:
+        queue.put(None)
+        return
+    rate = measure(bench[0], bench[1], minTime)
+    queue.put((rate, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - startPeak))
+
+
+# Wait for the result of a benchmark process. Returns None if it does not
+# apply to the width, raises a RuntimeError if the process died without a
+# result.
+def waitForResult(process, queue):
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except Queue.Empty:
+            if not process.is_alive():
+                break
+    try:
+        return queue.get(timeout=1.0)
+    except Queue.Empty:
+        raise RuntimeError("failed with exit code {0}".format(process.exitcode))
+
+
+# Run all benchmarks, each in a new process. Returns the list of results and
+# the list of (name, width, error) of the failed ones.
+def runAll(names, widths, minTime=_minTime):
+    results = []
+    failures = []
+    for name, setup, unit in _benchmarks:
+        if name not in names:
+            continue
+        for width in widths:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=runBenchmark, args=(name, width, minTime, queue))
+            process.start()
+            try:
+                result = waitForResult(process, queue)
+            except RuntimeError as e:
+                failures.append((name, width, str(e)))
+                print "{0:<12} {1:>3} bits {2}".format(name, width, e)
+                continue
+            finally:
+                process.join()
+            if result is None:
+                continue
+            rate, peakGrowth = result
+            results.append({'name': name, 'width': width, 'rate': rate, 'unit': unit, 'peak_growth_kb': peakGrowth})
+            print "{0:<12} {1:>3} bits {2:14.0f} {3:<8} {4:8d} kB more peak memory".format(name, width, rate, unit, peakGrowth)
+            sys.stdout.flush()
+    return results, failures
+
+
+# Compare the results with an earlier run. Returns the list of regressions as
+# (name, width, old rate, new rate).
+def compareResults(results, baseline, tolerance):
+    old = dict(((r['name'], r['width']), r['rate']) for r in baseline['results'])
+    regressions = []
+    for result in results:
+        key = (result['name'], result['width'])
+        if key in old and result['rate'] < old[key] * (1.0 - tolerance):
+            regressions.append((result['name'], result['width'], old[key], result['rate']))
+    return regressions
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of the Hamming table and halo tools.")
+    parser.add_argument("--widths", type=int, nargs="+", default=_defaultWidths,
+                        help="Signal lengths to measure. Default: %(default)s")
+    parser.add_argument("--only", nargs="+", metavar="NAME", default=[b[0] for b in _benchmarks],
+                        choices=[b[0] for b in _benchmarks],
+                        help="Run only these benchmarks: {0}".format(", ".join("'{0}'".format(b[0]) for b in _benchmarks)))
+    parser.add_argument("--time", type=float, default=_minTime,
+                        help="Seconds to run every benchmark at least. Default: %(default)s")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare with the results of an earlier run.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slow down before a benchmark counts as a regression. Default: %(default)s")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    results, failures = runAll(args.only, args.widths, args.time)
+    report = {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__ if numpy is not None else None,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.output:
+        outFile = open(args.output, 'w')
+        json.dump(report, outFile, indent=1, sort_keys=True)
+        outFile.close()
+
+    if args.compare:
+        baselineFile = open(args.compare, 'r')
+        baseline = json.load(baselineFile)
+        baselineFile.close()
+        regressions = compareResults(results, baseline, args.tolerance)
+        for name, width, oldRate, newRate in regressions:
+            print "Regression: {0} at {1} bits: {2:.0f} -> {3:.0f} ({4:+.0%})".format(
+                name, width, oldRate, newRate, newRate / oldRate - 1.0)
+        if regressions:
+            sys.exit(1)
+
+    if failures:
+        print "{0} benchmarks failed".format(len(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Hamming Code Parameter Cache
+#   ------------------------------
+#
+#  Description: Everything about a Hamming code, which does not depend on the
+#               words to encode: the number of parity bits, the positions of
+#               the parity and data bits, the parity masks and the syndrome
+#               table. They are calculated once per width and kept in memory,
+#               so all Hamming tools (hamming_table.py, hamming_vectors.py,
+#               hamming_vhdl.py) share them when they run over many widths.
+#
+#               The parameters can also be saved to a JSON file. If the
+#               environment variable HAMMING_CACHE names such a file, it is
+#               loaded when this module is imported. To write it for all
+#               widths up to 64 bits:
+#                 ./hamming_cache.py <cache_file>
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import os
+import sys
+import json
+from collections import namedtuple
+
+
+# The parameters of Ham(nTotalBits, nSignalBits). Positions are counted from 0
+# in the encoded word.
+#   runs:        runs of data bits as (shift in signal, mask, shift in encoded word)
+#   parityMasks: all positions covered by a parity bit, including itself
+#   correction:  the bit to flip for each syndrome
+CodeParameters = namedtuple('CodeParameters', [
+    'nSignalBits', 'nTotalBits', 'nParityBits', 'parityPositions', 'dataPositions',
+    'runs', 'parityMasks', 'correction'])
+
+
+# the memoized parameters, by (nSignalBits, nTotalBits)
+_codes = {}
+# the memoized number of parity bits, by nSignalBits
+_parityBits = {}
+
+
+# How many parity bits are needed for a signal length?
+def parityBitCount(nSignalBits):
+    if nSignalBits not in _parityBits:
+        nParityBits = 2
+        while 2**nParityBits - nParityBits - 1 < nSignalBits:
+            nParityBits += 1
+        _parityBits[nSignalBits] = nParityBits
+    return _parityBits[nSignalBits]
+
+
+def _calculate(nSignalBits, nTotalBits):
+    nParityBits = nTotalBits - nSignalBits
+
+    # parity bits sit at the positions 2^i (counted from 1)
+    parityPositions = []
+    while 2**len(parityPositions) - 1 < nTotalBits:
+        parityPositions.append(2**len(parityPositions) - 1)
+    if len(parityPositions) != nParityBits:
+        raise ValueError("Ham({0},{1}) is not a valid Hamming code".format(nTotalBits, nSignalBits))
+    parity = set(parityPositions)
+    dataPositions = [pos for pos in range(nTotalBits) if pos not in parity]
+
+    runs = []
+    start = 0
+    for i in range(1, nSignalBits+1):
+        if i == nSignalBits or dataPositions[i] != dataPositions[i-1] + 1:
+            runs.append((start, (1 << (i-start)) - 1, dataPositions[start]))
+            start = i
+
+    parityMasks = []
+    for pBit in range(nParityBits):
+        mask = 0
+        for pos in range(nTotalBits):
+            if (pos+1) & (1 << pBit):
+                mask |= 1 << pos
+        parityMasks.append(mask)
+
+    # The syndrome is the position (counted from 1) of a single flipped bit.
+    # Like in HammingDecoder, syndromes pointing beyond the encoded word are
+    # flagged as errors but nothing is corrected.
+    correction = [0] * 2**nParityBits
+    for pos in range(nTotalBits):
+        correction[pos+1] = 1 << pos
+
+    return CodeParameters(nSignalBits, nTotalBits, nParityBits, tuple(parityPositions), tuple(dataPositions),
+                          tuple(runs), tuple(parityMasks), tuple(correction))
+
+
+# The parameters of a Hamming code, calculated on the first call only. Without
+# nTotalBits the smallest code for the signal length is used.
+def codeParameters(nSignalBits, nTotalBits=None):
+    if nSignalBits < 1:
+        raise ValueError("signal length must be positive")
+    if nTotalBits is None:
+        nTotalBits = nSignalBits + parityBitCount(nSignalBits)
+    key = (nSignalBits, nTotalBits)
+    if key not in _codes:
+        _codes[key] = _calculate(nSignalBits, nTotalBits)
+    return _codes[key]
+
+
+# Add the parameters of a file written by save() to the cache
+def load(filename):
+    cacheFile = open(filename, 'r')
+    codes = json.load(cacheFile)
+    cacheFile.close()
+    for values in codes.values():
+        params = dict(values)
+        params['runs'] = tuple(tuple(run) for run in params['runs'])
+        for name in ('parityPositions', 'dataPositions', 'parityMasks', 'correction'):
+            params[name] = tuple(params[name])
+        params = CodeParameters(**params)
+        _codes[(params.nSignalBits, params.nTotalBits)] = params
+        if params.nTotalBits == params.nSignalBits + parityBitCount(params.nSignalBits):
+            _parityBits[params.nSignalBits] = params.nParityBits
+
+
+# Write all parameters in the cache to a JSON file
+def save(filename):
+    codes = {}
+    for (nSignalBits, nTotalBits), params in _codes.items():
+        codes["{0}:{1}".format(nSignalBits, nTotalBits)] = params._asdict()
+    cacheFile = open(filename, 'w')
+    json.dump(codes, cacheFile, indent=1, sort_keys=True)
+    cacheFile.close()
+
+
+if os.environ.get('HAMMING_CACHE') and os.path.isfile(os.environ['HAMMING_CACHE']):
+    load(os.environ['HAMMING_CACHE'])
+
+
+# How the program is intended to use
+def printUsage():
+    print "Usage: hamming_cache.py <cache_file> [<max_signal_length>]"
+    print ""
+    print "Options:"
+    print "  cache_file          The JSON file to write, use it with HAMMING_CACHE=<cache_file>"
+    print "  max_signal_length   Calculate the codes for all signal lengths up to this,"
+    print "                      default: 64"
+
+
+# The main program
+def main():
+    if len(sys.argv) not in (2, 3):
+        printUsage()
+        sys.exit(1)
+
+    maxSignalBits = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    for nSignalBits in range(1, maxSignalBits+1):
+        codeParameters(nSignalBits)
+    save(sys.argv[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Hamming Counter Model
+#   -----------------------
+#
+#  Description: A cycle based model of HammingCounter in hamming_components.vhd,
+#               to check traces of the simulator without running a second
+#               simulation. Many independent counters are advanced in lock-step
+#               as NumPy arrays. Bits of the Hamming register can be flipped
+#               at any cycle, the same way as a fault injection in the
+#               simulation.
+#
+#               A trace is a text file with one line per clock cycle, taken
+#               before the rising edge that ends the cycle, and for every
+#               counter the input and the outputs in that cycle:
+#                 cycle  enable count_out endofcount SEU_error  [enable ...]
+#               All numbers are decimal. Lines at the beginning starting with
+#               '#' are skipped. The first line is the first cycle after the
+#               reset.
+#
+#               Faults are given in a text file with one flipped bit per line:
+#                 cycle  counter  bit
+#               The bit is flipped in the Hamming register at the beginning of
+#               the cycle, so the outputs of this cycle already see it.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import sys
+import argparse
+
+from hamming_table import HammingCode, numpy
+from hamming_vectors import widthArgument
+
+
+# the columns of every counter in a trace
+_traceColumns = ['enable', 'count_out', 'endofcount', 'SEU_error']
+
+# how many trace lines are written at once
+_chunkLines = 1 << 12
+
+
+# Many HammingCounter instances of the same width. The only state is the
+# Hamming register, everything else is calculated from it like in the VHDL.
+class HammingCounterModel(object):
+    def __init__(self, nSignalBits, nTotalBits=None, nInstances=1):
+        self.code = HammingCode(nSignalBits, nTotalBits)
+        if not self.code.useNumpy:
+            raise ValueError("the counter model needs NumPy and an encoded word of at most 64 bits")
+        self.nInstances = nInstances
+        self.allOnes = numpy.uint64(2**nSignalBits - 1)
+        self.reset()
+
+    # nreset = '0': the register is cleared
+    def reset(self):
+        self.hammingReg = numpy.zeros(self.nInstances, dtype=numpy.uint64)
+        self.cycle = 0
+
+    # Flip the bits of the registers, one mask for every instance
+    def inject(self, masks):
+        self.hammingReg ^= numpy.asarray(masks, dtype=numpy.uint64)
+
+    # count_out, endofcount and SEU_error of the current cycle
+    def outputs(self):
+        count, seuError = self.code.decodeArray(self.hammingReg)
+        return count, count == self.allOnes, seuError
+
+    # The rising edge: the decoded count, incremented if enabled, is encoded
+    # and stored again
+    def step(self, enable=1, count=None):
+        if count is None:
+            count = self.code.decodeArray(self.hammingReg)[0]
+        count = (count + numpy.asarray(enable, dtype=numpy.uint64)) & self.allOnes
+        self.hammingReg = self.code.encodeArray(count)
+        self.cycle += 1
+
+    # Run the counters for many cycles with the given enables, an array of
+    # (cycles x instances) or one value per cycle for all instances.
+    # Without faults the register always holds a valid code word, so the count
+    # is just the sum of the enables: the cycles between two faults are
+    # calculated at once with a cumulative sum. Faults are either given as a
+    # dict of masks by cycle (see faultMasks()), or by faultHook(cycle, model),
+    # which is called at the beginning of every cycle and may return masks
+    # (this is slow, as every cycle is calculated on its own then).
+    # Returns count_out, endofcount and SEU_error of all cycles as
+    # (cycles x instances) arrays.
+    def run(self, enables, faults=None, faultHook=None):
+        enables = numpy.asarray(enables, dtype=numpy.uint64)
+        if enables.ndim == 1:
+            enables = numpy.repeat(enables[:, None], self.nInstances, axis=1)
+        nCycles = len(enables)
+        counts = numpy.zeros((nCycles, self.nInstances), dtype=numpy.uint64)
+        seuErrors = numpy.zeros((nCycles, self.nInstances), dtype=bool)
+
+        if nCycles == 0:
+            starts = []
+        elif faultHook is not None:
+            starts = range(nCycles)
+        else:
+            starts = sorted(set([0] + [cycle - self.cycle for cycle in (faults or {})
+                                       if 0 <= cycle - self.cycle < nCycles]))
+        for start, stop in zip(starts, starts[1:] + [nCycles]):
+            if faults and self.cycle in faults:
+                self.inject(faults[self.cycle])
+            if faultHook is not None:
+                masks = faultHook(self.cycle, self)
+                if masks is not None:
+                    self.inject(masks)
+
+            count, seuErrors[start] = self.code.decodeArray(self.hammingReg)
+            steps = numpy.cumsum(enables[start:stop], axis=0, dtype=numpy.uint64)
+            counts[start] = count
+            counts[start+1:stop] = (count + steps[:-1]) & self.allOnes
+            self.hammingReg = self.code.encodeArray((count + steps[-1]) & self.allOnes)
+            self.cycle += stop - start
+
+        return counts, counts == self.allOnes, seuErrors
+
+
+# The masks to flip for a list of (cycle, instance, bit), as a dict by cycle
+def faultMasks(faults, nInstances):
+    masks = {}
+    for cycle, instance, bit in faults:
+        if cycle not in masks:
+            masks[cycle] = numpy.zeros(nInstances, dtype=numpy.uint64)
+        masks[cycle][instance] ^= numpy.uint64(1) << numpy.uint64(bit)
+    return masks
+
+
+def readFaults(filename):
+    faults = []
+    faultFile = open(filename, 'r')
+    for line in faultFile:
+        line = line.split('#')[0].split()
+        if len(line) == 3:
+            faults.append(tuple(int(x) for x in line))
+    faultFile.close()
+    return faults
+
+
+# Read a trace of nInstances counters. Returns the cycles and a dict of
+# (cycles x instances) arrays by column name.
+def readTrace(filename, nInstances):
+    traceFile = open(filename, 'r')
+    line = traceFile.readline()
+    while line.startswith('#'):
+        line = traceFile.readline()
+    values = numpy.fromstring(line + traceFile.read(), dtype=numpy.uint64, sep=' ')
+    traceFile.close()
+
+    nColumns = 1 + len(_traceColumns) * nInstances
+    if len(values) % nColumns:
+        raise ValueError("{0}: the number of values does not fit to {1} columns".format(filename, nColumns))
+    values = values.reshape(-1, nColumns)
+    trace = {}
+    for i, name in enumerate(_traceColumns):
+        trace[name] = values[:, 1+i::len(_traceColumns)]
+    return values[:, 0], trace
+
+
+# Write a trace in the same format, for instance as the expected values for a
+# testbench
+def writeTrace(outFile, cycles, enables, counts, endOfCount, seuErrors):
+    columns = [numpy.asarray(cycles, dtype=numpy.uint64)[:, None]]
+    for values in zip(enables.T, counts.T, endOfCount.T, seuErrors.T):
+        columns.extend(numpy.asarray(column, dtype=numpy.uint64)[:, None] for column in values)
+    values = numpy.hstack(columns)
+    for start in xrange(0, len(values), _chunkLines):
+        outFile.write("".join(" ".join(map(str, row)) + "\n" for row in values[start:start+_chunkLines].tolist()))
+
+
+# Replay the enables of the trace with the model and compare all outputs. The
+# cycles of the faults are counted like in the first column of the trace.
+# Returns the list of differences as (cycle, instance, signal, trace value,
+# model value), sorted by cycle.
+def compareTrace(model, cycles, trace, faults=None, faultHook=None):
+    model.reset()
+    if len(cycles):
+        model.cycle = int(cycles[0])
+    counts, endOfCount, seuErrors = model.run(trace['enable'], faults, faultHook)
+    expected = {'count_out': counts, 'endofcount': endOfCount, 'SEU_error': seuErrors}
+
+    differences = []
+    for name in _traceColumns[1:]:
+        wrong = numpy.nonzero(trace[name] != expected[name].astype(numpy.uint64))
+        for row, instance in zip(*wrong):
+            differences.append((int(cycles[row]), int(instance), name, int(trace[name][row, instance]),
+                                int(expected[name][row, instance])))
+    differences.sort()
+    return differences
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Check a simulator trace of HammingCounter instances against a model of the counter.")
+    parser.add_argument("trace", help="The trace file to check (or to write with --generate).")
+    parser.add_argument("width", type=widthArgument, metavar="NBITS[:NBITSENC]",
+                        help="The generics of the counters, for instance 4:7 or 16.")
+    parser.add_argument("-n", "--instances", type=int, default=1,
+                        help="Number of counters in the trace. Default: %(default)s")
+    parser.add_argument("--faults", help="File with the flipped bits: <cycle> <counter> <bit> per line.")
+    parser.add_argument("--generate", type=int, metavar="CYCLES",
+                        help="Do not check, but write the trace of the model for this many cycles "
+                             "with enable = '1'.")
+    parser.add_argument("--max-errors", dest="maxErrors", type=int, default=20,
+                        help="Print at most this many differences. Default: %(default)s")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    nSignalBits, nTotalBits = args.width
+    model = HammingCounterModel(nSignalBits, nTotalBits, args.instances)
+    faults = None
+    if args.faults:
+        faults = faultMasks(readFaults(args.faults), args.instances)
+
+    if args.generate:
+        enables = numpy.ones((args.generate, args.instances), dtype=numpy.uint64)
+        outputs = model.run(enables, faults)
+        outFile = open(args.trace, 'w')
+        outFile.write("# HammingCounter Ham({0},{1}), {2} counters: cycle {3} ...\n".format(
+            nTotalBits, nSignalBits, args.instances, " ".join(_traceColumns)))
+        writeTrace(outFile, numpy.arange(args.generate), enables, *outputs)
+        outFile.close()
+        return
+
+    cycles, trace = readTrace(args.trace, args.instances)
+    differences = compareTrace(model, cycles, trace, faults)
+    for cycle, instance, name, traceValue, modelValue in differences[:args.maxErrors]:
+        print "cycle {0}, counter {1}: {2} is {3}, expected {4}".format(cycle, instance, name, traceValue, modelValue)
+    if differences:
+        print "{0} differences in {1} cycles of {2} counters".format(len(differences), len(cycles), args.instances)
+        sys.exit(1)
+    print "OK: {0} cycles of {1} counters".format(len(cycles), args.instances)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Hamming Code Reliability Simulator
+#   ------------------------------------
+#
+#  Description: Estimates how often a Hamming protected register of
+#               hamming_components.vhd (HammingRegister, HammingCounter) returns
+#               a wrong value, for a given upset rate per bit and a given time
+#               between two rewrites of the register. The counter decodes and
+#               rewrites its value every clock cycle, so there the interval is
+#               the clock period.
+#
+#               Within one interval the number of flipped bits of a word is
+#               Poisson distributed. Words with no or one flip are always
+#               decoded correctly, so only the words with k >= 2 flips are
+#               simulated: for every k many words are corrupted at k random
+#               positions (a bit hit twice flips back) and decoded like in
+#               HammingDecoder. The failure probability of an interval is then
+#               the sum over k of P(k flips) * P(wrong value | k flips).
+#               This way also very small upset rates are answered in seconds.
+#
+#               The code is linear, so the decoded error does not depend on the
+#               stored value: all words are simulated as zero and every bit set
+#               after decoding is a wrong bit.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import math
+import random
+import argparse
+import multiprocessing
+
+from hamming_table import HammingCode, numpy
+from hamming_vectors import widthArgument
+
+
+# how many words are simulated at once in a process
+_shardTrials = 1 << 20
+
+# stop at the number of flips, where the rest of the Poisson distribution is
+# smaller than this
+_tailLimit = 1e-15
+
+
+# Probability of k events of a Poisson distribution with the given mean
+def poissonProbability(k, mean):
+    if mean == 0:
+        return 1.0 if k == 0 else 0.0
+    return math.exp(k * math.log(mean) - mean - math.lgamma(k + 1))
+
+
+# The largest number of flips worth simulating for the given mean. At least
+# three flips are simulated, the fewest that can pass unnoticed.
+def maxFlips(mean, nTotalBits, limit=_tailLimit):
+    k = 3
+    total = sum(poissonProbability(i, mean) for i in range(0, k+1))
+    while 1.0 - total > limit and k < 4 * nTotalBits:
+        k += 1
+        total += poissonProbability(k, mean)
+    return k
+
+
+# Corrupt nTrials zero words at nFlips random positions each and decode them.
+# A job is a tuple of (signal length, encoded length, flips, trials, seed).
+# Returns the job and the number of wrong words, and of those how many were
+# not flagged by SEU_error.
+def simulateFlips(job):
+    nSignalBits, nTotalBits, nFlips, nTrials, seed = job
+    code = HammingCode(nSignalBits, nTotalBits)
+
+    if not code.useNumpy:
+        rand = random.Random(seed)
+        nWrong = nSilent = 0
+        for trial in xrange(nTrials):
+            corrupted = 0
+            for flip in range(nFlips):
+                corrupted ^= 1 << rand.randrange(nTotalBits)
+            decoded, seuError = code.decode(corrupted)
+            if decoded:
+                nWrong += 1
+                nSilent += not seuError
+        return job, nWrong, nSilent
+
+    rand = numpy.random.RandomState(seed % 2**32)
+    corrupted = numpy.zeros(nTrials, dtype=numpy.uint64)
+    for flip in range(nFlips):
+        corrupted ^= numpy.uint64(1) << rand.randint(0, nTotalBits, size=nTrials).astype(numpy.uint64)
+    decoded, seuError = code.decodeArray(corrupted)
+    wrong = decoded != 0
+    return job, int(numpy.count_nonzero(wrong)), int(numpy.count_nonzero(wrong & ~seuError))
+
+
+# The probability that a word has a wrong value after k flips, for every k
+# from 2 to the maximum number of flips of the code. codes is a list of
+# (signal length, encoded length, maximum flips). The trials of all codes and
+# flips are split into shards, which run in parallel. Returns a dict by
+# (signal length, encoded length) of lists, indexed by k, with (P(wrong),
+# P(wrong and not flagged)).
+def flipFailures(codes, nTrials, seed=1, processes=None):
+    jobs = []
+    for nSignalBits, nTotalBits, kMax in codes:
+        for k in range(2, kMax+1):
+            for start in xrange(0, nTrials, _shardTrials):
+                jobs.append((nSignalBits, nTotalBits, k, min(_shardTrials, nTrials - start), seed + len(jobs)))
+
+    counts = {}
+    pool = multiprocessing.Pool(processes) if processes != 1 else None
+    try:
+        results = pool.imap_unordered(simulateFlips, jobs) if pool else map(simulateFlips, jobs)
+        for job, nWrong, nSilent in results:
+            key = (job[0], job[1], job[2])
+            trials, wrong, silent = counts.get(key, (0, 0, 0))
+            counts[key] = (trials + job[3], wrong + nWrong, silent + nSilent)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    failures = {}
+    for nSignalBits, nTotalBits, kMax in codes:
+        failures[(nSignalBits, nTotalBits)] = [(0.0, 0.0), (0.0, 0.0)] + [
+            (float(counts[(nSignalBits, nTotalBits, k)][1]) / counts[(nSignalBits, nTotalBits, k)][0],
+             float(counts[(nSignalBits, nTotalBits, k)][2]) / counts[(nSignalBits, nTotalBits, k)][0])
+            for k in range(2, kMax+1)]
+    return failures
+
+
+# The probability of a wrong value within one interval, given the failures
+# per number of flips. Returns P(wrong), P(wrong and not flagged) and the part
+# of the Poisson distribution beyond the simulated flips (an upper bound of
+# the error of both).
+def intervalFailure(failures, nTotalBits, rate, interval):
+    mean = nTotalBits * rate * interval
+    wrong = silent = 0.0
+    for k, (pWrong, pSilent) in enumerate(failures):
+        p = poissonProbability(k, mean)
+        wrong += p * pWrong
+        silent += p * pSilent
+
+    # summed up directly, 1 - P(k <= kMax) would be lost in rounding
+    tail = 0.0
+    k = len(failures)
+    while True:
+        p = poissonProbability(k, mean)
+        tail += p
+        if p <= tail * _tailLimit or k > len(failures) + 10 * (mean + 10):
+            break
+        k += 1
+    return wrong, silent, tail
+
+
+# The same for a register without protection: a bit is wrong if it flipped an
+# odd number of times
+def unprotectedFailure(nSignalBits, rate, interval):
+    pBit = -math.expm1(-2 * rate * interval) / 2
+    return -math.expm1(nSignalBits * math.log1p(-pBit))
+
+
+# The probability of at least one failure in a number of independent intervals
+def missionFailure(pInterval, nIntervals):
+    if pInterval >= 1.0:
+        return 1.0
+    return -math.expm1(nIntervals * math.log1p(-pInterval))
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Estimate the probability of wrong values of Hamming protected registers "
+                    "for a given upset rate and rewrite interval.")
+    parser.add_argument("widths", nargs="+", type=widthArgument, metavar="NBITS[:NBITSENC]",
+                        help="Lengths of the data (and encoded) words, for instance 4:7 or 16.")
+    parser.add_argument("--rate", type=float, required=True,
+                        help="Upsets per bit and second.")
+    parser.add_argument("--interval", type=float, nargs="+", required=True,
+                        help="Seconds between two rewrites of the register (the clock period for "
+                             "HammingCounter). More than one interval can be given.")
+    parser.add_argument("--mission", type=float, default=3600.0,
+                        help="Operating time in seconds for the total failure probability. Default: %(default)s")
+    parser.add_argument("--trials", type=int, default=1 << 20,
+                        help="Simulated words per code and number of flips. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random flips. Default: %(default)s")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes. Default: one per CPU")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    codes = []
+    for nSignalBits, nTotalBits in args.widths:
+        kMax = max(maxFlips(nTotalBits * args.rate * interval, nTotalBits) for interval in args.interval)
+        codes.append((nSignalBits, nTotalBits, kMax))
+    failures = flipFailures(codes, args.trials, args.seed, args.jobs)
+
+    print "# upset rate {0:g} /bit/s, mission {1:g} s, {2} words per code and number of flips".format(
+        args.rate, args.mission, args.trials)
+    print "# {0:>10} {1:>12} {2:>12} {3:>12} {4:>12} {5:>12} {6:>12}".format(
+        "code", "interval/s", "P(wrong)", "P(silent)", "tail", "P(mission)", "unprotected")
+    for nSignalBits, nTotalBits, kMax in codes:
+        for interval in args.interval:
+            wrong, silent, tail = intervalFailure(failures[(nSignalBits, nTotalBits)], nTotalBits, args.rate, interval)
+            nIntervals = args.mission / interval
+            print "  {0:>10} {1:12.4g} {2:12.4g} {3:12.4g} {4:12.4g} {5:12.4g} {6:12.4g}".format(
+                "Ham({0},{1})".format(nTotalBits, nSignalBits), interval, wrong, silent, tail,
+                missionFailure(wrong, nIntervals),
+                missionFailure(unprotectedFailure(nSignalBits, args.rate, interval), nIntervals))
+
+
+if __name__ == '__main__':
+    main()
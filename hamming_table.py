@@ -15,12 +15,25 @@
 #
 #  Revisions:
 #    1.0 Initial revision
+#    1.1 HammingCode engine with precomputed masks, encoding of whole arrays
+#        with NumPy, signal lengths up to 64 bits
+#    1.2 Output formats: packed binary, $readmemh, VHDL ROM; written in chunks
+#    1.3 Decoder with correction, the same as HammingDecoder in VHDL
+#    1.4 Code parameters from the shared cache in hamming_cache.py
 #
 # ------------------------------------------------------------------------------
 
 # Import stuff
 import sys
 
+from hamming_cache import codeParameters, parityBitCount
+
+# NumPy is only needed to encode whole arrays at once
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # default values
 nSignalBits = 4
 nParityBits = 3
@@ -85,35 +98,271 @@ def isParityPosition(pos):
 
 # how many parity bits do we need?
 def ParityBits():
-    for m in range(2, nSignalBits+2):
-        sigLenMax = 2**m - m - 1
-        if (sigLenMax >= nSignalBits):
-            return m
+    return parityBitCount(nSignalBits)
+
+
+# The Hamming code for a given signal length. Everything that does not depend
+# on the signal itself is taken from hamming_cache, so it is calculated only
+# once per width and encoding a word is reduced to a few shifts and masks:
+#   - the data bits are moved in runs of consecutive bits between two parity
+#     positions, instead of one by one
+#   - parity bit i is the parity of the encoded word masked with all positions
+#     p (counted from 1) with bit i set in p
+# The bit order is the same as in HamCode() and hamming_components.vhd.
+class HammingCode(object):
+    def __init__(self, nSignalBits, nTotalBits=None):
+        params = codeParameters(nSignalBits, nTotalBits)
+        self.nSignalBits = params.nSignalBits
+        self.nTotalBits = params.nTotalBits
+        self.nParityBits = params.nParityBits
+
+        # positions of the parity and data bits in the encoded word
+        self.parityPositions = params.parityPositions
+        self.dataPositions = params.dataPositions
+
+        # runs of data bits: (shift in signal, mask, shift in encoded word)
+        self.runs = params.runs
+
+        # all positions covered by a parity bit, including the parity bit itself
+        self.parityMasks = params.parityMasks
+
+        # the bit to flip for each syndrome
+        self.correction = params.correction
+
+        # arrays are encoded with NumPy if the encoded word fits into 64 bits,
+        # that is up to 57 signal bits
+        self.useNumpy = numpy is not None and self.nTotalBits <= 64
+        if self.useNumpy:
+            self.correctionArray = numpy.array(self.correction, dtype=numpy.uint64)
+
+    # Encode a single signal word
+    def encode(self, signal):
+        encoded = 0
+        for sigShift, mask, encShift in self.runs:
+            encoded |= ((signal >> sigShift) & mask) << encShift
+        for pos, mask in zip(self.parityPositions, self.parityMasks):
+            encoded |= (bin(encoded & mask).count('1') & 1) << pos
+        return encoded
+
+    # Encode a sequence of signal words. Returns an uint64 NumPy array if
+    # possible, a list otherwise.
+    def encodeArray(self, signals):
+        if not self.useNumpy:
+            return [self.encode(int(signal)) for signal in signals]
+
+        signals = numpy.asarray(signals, dtype=numpy.uint64)
+        encoded = numpy.zeros(signals.shape, dtype=numpy.uint64)
+        for sigShift, mask, encShift in self.runs:
+            encoded |= ((signals >> numpy.uint64(sigShift)) & numpy.uint64(mask)) << numpy.uint64(encShift)
+        for pos, mask in zip(self.parityPositions, self.parityMasks):
+            encoded |= parityArray(encoded & numpy.uint64(mask)) << numpy.uint64(pos)
+        return encoded
+
+
+    # The syndrome of an encoded word: bit i is the parity of the positions
+    # covered by parity bit i
+    def syndrome(self, encoded):
+        syndrome = 0
+        for pBit, mask in enumerate(self.parityMasks):
+            syndrome |= (bin(encoded & mask).count('1') & 1) << pBit
+        return syndrome
+
+    # Decode a single (maybe corrupted) word. Returns the corrected signal word
+    # and if an error was found (SEU_error).
+    def decode(self, encoded):
+        syndrome = self.syndrome(encoded)
+        encoded ^= self.correction[syndrome]
+        signal = 0
+        for sigShift, mask, encShift in self.runs:
+            signal |= ((encoded >> encShift) & mask) << sigShift
+        return signal, syndrome != 0
+
+    # The syndromes of a sequence of encoded words
+    def syndromeArray(self, encoded):
+        if not self.useNumpy:
+            return [self.syndrome(int(enc)) for enc in encoded]
+
+        encoded = numpy.asarray(encoded, dtype=numpy.uint64)
+        syndromes = numpy.zeros(encoded.shape, dtype=numpy.uint64)
+        for pBit, mask in enumerate(self.parityMasks):
+            syndromes |= parityArray(encoded & numpy.uint64(mask)) << numpy.uint64(pBit)
+        return syndromes
+
+    # Decode a sequence of encoded words. Returns the corrected signal words
+    # and the error flags, as NumPy arrays if possible, as lists otherwise.
+    def decodeArray(self, encoded):
+        if not self.useNumpy:
+            decoded = [self.decode(int(enc)) for enc in encoded]
+            return [x[0] for x in decoded], [x[1] for x in decoded]
+
+        encoded = numpy.asarray(encoded, dtype=numpy.uint64)
+        syndromes = self.syndromeArray(encoded)
+        corrected = encoded ^ self.correctionArray[syndromes.astype(numpy.intp)]
+        signals = numpy.zeros(encoded.shape, dtype=numpy.uint64)
+        for sigShift, mask, encShift in self.runs:
+            signals |= ((corrected >> numpy.uint64(encShift)) & numpy.uint64(mask)) << numpy.uint64(sigShift)
+        return signals, syndromes != 0
+
+
+# Parity of every element of an uint64 NumPy array, by folding the bits onto
+# each other with XOR
+def parityArray(words):
+    words = words.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        words ^= words >> numpy.uint64(shift)
+    return words & numpy.uint64(1)
+
+
+# Generate the table in chunks of consecutive signal words. Yields the signal
+# words and the encoded words of each chunk, as NumPy arrays if possible.
+def TableChunks(code, chunkSize=1 << 16, start=0, stop=None):
+    if stop is None:
+        stop = 2**code.nSignalBits
+    chunkStart = start
+    while chunkStart < stop:
+        chunkStop = min(chunkStart + chunkSize, stop)
+        if code.useNumpy:
+            signals = numpy.arange(chunkStart, chunkStop, dtype=numpy.uint64)
+        else:
+            signals = [chunkStart + i for i in range(chunkStop - chunkStart)]
+        yield signals, code.encodeArray(signals)
+        chunkStart = chunkStop
+
+
+# The characters '0' and '1' of every bit of the words, MSB first, as an
+# (words x width) uint8 array
+def bitChars(words, width):
+    shifts = numpy.arange(width-1, -1, -1, dtype=numpy.uint64)
+    return ((words[:, None] >> shifts) & numpy.uint64(1)).astype(numpy.uint8) + ord('0')
+
+
+# The hex digits of the words, MSB first, as an (words x digits) uint8 array
+def hexChars(words, digits):
+    shifts = numpy.arange(4*(digits-1), -1, -4, dtype=numpy.uint64)
+    nibbles = ((words[:, None] >> shifts) & numpy.uint64(15)).astype(numpy.intp)
+    return numpy.frombuffer("0123456789abcdef", dtype=numpy.uint8)[nibbles]
+
+
+# A column of the same characters for every row of an array of characters
+def charColumn(rows, chars):
+    return numpy.tile(numpy.frombuffer(chars, dtype=numpy.uint8), (rows, 1))
+
+
+# Lines of text, each with the signal and the encoded word in binary
+def writeText(code, outFile):
+    outFile.write("Printing table for Ham({0},{1}):\n".format(code.nTotalBits, code.nSignalBits))
+    for signals, encoded in TableChunks(code):
+        if code.useNumpy:
+            rows = len(signals)
+            outFile.write(numpy.hstack((
+                bitChars(signals, code.nSignalBits), charColumn(rows, "   "),
+                bitChars(encoded, code.nTotalBits), charColumn(rows, "\n"))).tobytes())
+        else:
+            outFile.write("".join("{0:0{2}b}   {1:0{3}b}\n".format(signal, enc, code.nSignalBits, code.nTotalBits)
+                                  for signal, enc in zip(signals, encoded)))
+
+
+# Packed binary file: the encoded words as little-endian unsigned integers of
+# the smallest number of bytes, at the position of the signal word. So the
+# encoded word of signal s starts at byte s * ceil(nTotalBits/8).
+def writeBinary(code, outFile):
+    nBytes = (code.nTotalBits + 7) // 8
+    for signals, encoded in TableChunks(code):
+        if code.useNumpy:
+            words = encoded.astype('<u8').view(numpy.uint8).reshape(-1, 8)
+            outFile.write(words[:, :nBytes].tobytes())
+        else:
+            outFile.write("".join(chr((enc >> 8*i) & 0xff) for enc in encoded for i in range(nBytes)))
+
+
+# One hex word per line, to be read by $readmemh in verilog
+def writeMemh(code, outFile):
+    nDigits = (code.nTotalBits + 3) // 4
+    for signals, encoded in TableChunks(code):
+        if code.useNumpy:
+            outFile.write(numpy.hstack((hexChars(encoded, nDigits), charColumn(len(encoded), "\n"))).tobytes())
+        else:
+            outFile.write("".join("{0:0{1}x}\n".format(enc, nDigits) for enc in encoded))
+
+
+# A VHDL package with the table as a ROM constant, indexed by the signal word
+def writeVHDL(code, outFile, packageName=None):
+    if packageName is None:
+        packageName = "hamming_rom_{0}_{1}".format(code.nTotalBits, code.nSignalBits)
+    outFile.write(
+        "-- Hamming code table Ham({0},{1}), generated by hamming_table.py\n"
+        "library ieee;\n"
+        "use ieee.std_logic_1164.all;\n"
+        "\n"
+        "package {2} is\n"
+        "  subtype hamming_word_t is std_logic_vector({0}-1 downto 0);\n"
+        "  type hamming_rom_t is array (0 to 2**{1}-1) of hamming_word_t;\n"
+        "  constant HAMMING_ROM : hamming_rom_t := (\n".format(code.nTotalBits, code.nSignalBits, packageName))
+
+    # the first element starts with '(' instead of ','
+    separator = "    "
+    for signals, encoded in TableChunks(code):
+        if code.useNumpy:
+            rows = len(encoded)
+            lines = numpy.hstack((charColumn(rows, "  , \""), bitChars(encoded, code.nTotalBits), charColumn(rows, "\"\n")))
+            lines[0, :4] = numpy.frombuffer(separator, dtype=numpy.uint8)
+            outFile.write(lines.tobytes())
+        else:
+            outFile.write("".join("  , \"{0:0{1}b}\"\n".format(enc, code.nTotalBits) for enc in encoded).replace("  , ", separator, 1))
+        separator = "  , "
+
+    outFile.write(
+        "  );\n"
+        "end package;\n")
+
+
+# the output formats of the table
+_writers = {
+    'text': writeText,
+    'bin':  writeBinary,
+    'memh': writeMemh,
+    'vhdl': writeVHDL,
+}
 
 
 # How the program is intended to use
 def printUsage():
-    print "Usage: hamming_table.py [<signal_length>]"
+    print "Usage: hamming_table.py [<signal_length> [<format> [<output_file>]]]"
     print ""
     print "Options:"
-    print "  signal_length   default: 4"
+    print "  signal_length   default: 4, maximum: 64"
+    print "                  with NumPy the table is encoded in whole arrays up"
+    print "                  to 57 bits (64 bit encoded words), longer signals"
+    print "                  are encoded word by word"
+    print "  format          text: signal and encoded word in binary (default)"
+    print "                  bin:  encoded words as little-endian integers of"
+    print "                        ceil(n/8) bytes, indexed by the signal word"
+    print "                  memh: one hex word per line for $readmemh"
+    print "                  vhdl: VHDL package with the table as a ROM constant"
+    print "  output_file     default: standard output"
 
 
 # The main program
 def main():
     global nSignalBits, nParityBits, nTotalBits
 
-    if len(sys.argv) > 1 and int(sys.argv[1]) > 0 and int(sys.argv[1]) <= 10:
+    if len(sys.argv) > 1 and int(sys.argv[1]) > 0 and int(sys.argv[1]) <= 64:
         nSignalBits = int(sys.argv[1])
         nParityBits = ParityBits()
         nTotalBits = nSignalBits + nParityBits
 
-    print "Printing table for Ham(" + str(nTotalBits) + "," + str(nSignalBits) + "):"
+    outFormat = sys.argv[2] if len(sys.argv) > 2 else "text"
+    if outFormat not in _writers:
+        printUsage()
+        sys.exit(1)
+
+    if len(sys.argv) > 3:
+        outFile = open(sys.argv[3], 'wb', 1 << 20)
+    else:
+        outFile = sys.stdout
 
-    for signal in range(0, 2**nSignalBits):
-        sigBin = str(bin(signal))[2:].zfill(nSignalBits)
-        hamBin = str(bin(HamCode(signal)))[2:].zfill(nTotalBits)
-        print sigBin + "   " + hamBin
+    _writers[outFormat](HammingCode(nSignalBits), outFile)
+    outFile.close()
 
 
 if __name__ == '__main__':
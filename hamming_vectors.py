@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Hamming Code Test Vector Generator
+#   ------------------------------------
+#
+#  Description: Writes test vectors for the Hamming components in
+#               hamming_components.vhd. For every data word the file contains
+#               the encoded word, the encoded word with bits flipped and what
+#               the decoder is expected to return for it. There is one file per
+#               width and error class (no, single or double bit errors); all
+#               files are generated in parallel by a pool of processes.
+#
+#               Each line of a vector file can be read with textio:
+#                 data_in  data_enc  data_corrupt  data_out  SEU_error
+#               The first line is a comment starting with '#'.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import os
+import random
+import argparse
+import multiprocessing
+from itertools import combinations
+
+from hamming_table import HammingCode, bitChars, charColumn, numpy
+from hamming_cache import codeParameters
+
+
+# how many vector lines are generated and written at once
+_chunkLines = 1 << 16
+
+_errorClasses = ['none', 'single', 'double']
+
+
+# All error masks of an error class for an encoded word of the given length
+def errorMasks(errorClass, nTotalBits):
+    if errorClass == 'none':
+        return [0]
+    if errorClass == 'single':
+        return [1 << pos for pos in range(nTotalBits)]
+    return [(1 << a) | (1 << b) for a, b in combinations(range(nTotalBits), 2)]
+
+
+# The data words to test: all of them, if there are not more than maxWords,
+# otherwise maxWords random ones. Yields chunks of words.
+def dataWords(code, maxWords, seed, chunkSize):
+    nWords = 2**code.nSignalBits
+    exhaustive = nWords <= maxWords
+    if not exhaustive:
+        nWords = maxWords
+    rand = random.Random(seed)
+    if code.useNumpy:
+        randArray = numpy.random.RandomState(seed % 2**32)
+
+    for start in xrange(0, nWords, chunkSize):
+        stop = min(start + chunkSize, nWords)
+        if exhaustive and code.useNumpy:
+            yield numpy.arange(start, stop, dtype=numpy.uint64)
+        elif exhaustive:
+            yield range(start, stop)
+        elif code.useNumpy:
+            high = randArray.randint(0, 2**32, size=stop-start).astype(numpy.uint64)
+            low = randArray.randint(0, 2**32, size=stop-start).astype(numpy.uint64)
+            yield ((high << numpy.uint64(32)) | low) & numpy.uint64(2**code.nSignalBits - 1)
+        else:
+            yield [rand.getrandbits(code.nSignalBits) for i in range(stop-start)]
+
+
+# The lines of the vector file for one chunk of data words
+def vectorLines(code, words, masks):
+    encoded = code.encodeArray(words)
+
+    if code.useNumpy:
+        masks = numpy.array(masks, dtype=numpy.uint64)
+        words = numpy.repeat(words, len(masks))
+        encoded = numpy.repeat(encoded, len(masks))
+        corrupted = encoded ^ numpy.tile(masks, len(encoded) // len(masks))
+        decoded, seuError = code.decodeArray(corrupted)
+        rows = len(words)
+        return numpy.hstack((
+            bitChars(words, code.nSignalBits), charColumn(rows, " "),
+            bitChars(encoded, code.nTotalBits), charColumn(rows, " "),
+            bitChars(corrupted, code.nTotalBits), charColumn(rows, " "),
+            bitChars(decoded, code.nSignalBits), charColumn(rows, " "),
+            seuError.astype(numpy.uint8)[:, None] + ord('0'), charColumn(rows, "\n"))).tobytes()
+
+    lines = []
+    for word, enc in zip(words, encoded):
+        for mask in masks:
+            decoded, seuError = code.decode(enc ^ mask)
+            lines.append("{0:0{5}b} {1:0{6}b} {2:0{6}b} {3:0{5}b} {4:d}\n".format(
+                word, enc, enc ^ mask, decoded, seuError, code.nSignalBits, code.nTotalBits))
+    return "".join(lines)
+
+
+# Write the vector file of one width and error class. A job is a tuple of
+# (output file, signal length, encoded length, error class, maximum number of
+# data words, random seed). Returns the file name and the number of vectors.
+def generateVectors(job):
+    filename, nSignalBits, nTotalBits, errorClass, maxWords, seed = job
+    code = HammingCode(nSignalBits, nTotalBits)
+    masks = errorMasks(errorClass, code.nTotalBits)
+    chunkSize = max(1, _chunkLines // len(masks))
+
+    outFile = open(filename, 'wb', 1 << 20)
+    outFile.write("# Ham({0},{1}), {2} bit errors: data_in data_enc data_corrupt data_out SEU_error\n".format(
+        code.nTotalBits, code.nSignalBits, errorClass))
+    nVectors = 0
+    for words in dataWords(code, maxWords, seed, chunkSize):
+        outFile.write(vectorLines(code, words, masks))
+        nVectors += len(words) * len(masks)
+    outFile.close()
+    return filename, nVectors
+
+
+# Widths are given as <NBits> or <NBits>:<NBitsEnc>. Raises a ValueError if
+# this is no valid Hamming code.
+def parseWidth(width):
+    parts = width.split(':')
+    try:
+        if len(parts) > 2:
+            raise ValueError
+        nSignalBits = int(parts[0])
+        nTotalBits = int(parts[1]) if len(parts) > 1 else None
+    except ValueError:
+        raise ValueError("'{0}' is no width like 16 or 11:15".format(width))
+    params = codeParameters(nSignalBits, nTotalBits)
+    return params.nSignalBits, params.nTotalBits
+
+
+# parseWidth() for argparse, which then prints the usage and the error
+def widthArgument(width):
+    try:
+        return parseWidth(width)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Write test vectors with bit errors for the Hamming components in VHDL.")
+    parser.add_argument("output_dir", help="Where to write the vector files.")
+    parser.add_argument("widths", nargs="+", type=widthArgument, metavar="NBITS[:NBITSENC]",
+                        help="Lengths of the data (and encoded) words, for instance 4:7 or 16.")
+    parser.add_argument("--words", type=int, default=2**16,
+                        help="Test all data words if there are not more than this, otherwise "
+                             "this many random ones. Default: %(default)s")
+    parser.add_argument("--double", action="store_true", help="Also write vectors with two flipped bits.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the random data words. Default: %(default)s")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes. Default: one per CPU")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    errorClasses = _errorClasses if args.double else _errorClasses[:2]
+    jobs = []
+    for i, (nSignalBits, nTotalBits) in enumerate(args.widths):
+        for errorClass in errorClasses:
+            filename = os.path.join(args.output_dir, "hamming_{0}_{1}_{2}.txt".format(nSignalBits, nTotalBits, errorClass))
+            jobs.append((filename, nSignalBits, nTotalBits, errorClass, args.words, args.seed + i))
+
+    pool = multiprocessing.Pool(args.jobs)
+    try:
+        results = pool.map(generateVectors, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    for filename, nVectors in results:
+        print "{0}: {1} vectors".format(filename, nVectors)
+
+
+if __name__ == '__main__':
+    main()
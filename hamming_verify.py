@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Hamming Code Verifier
+#   -----------------------
+#
+#  Description: Proves that the codes of hamming_table.py have a minimum
+#               distance of 3 and correct every single bit error, before a
+#               table or encoder goes into the RTL.
+#
+#               Comparing all pairs of code words is impossible for wide words,
+#               so the properties are checked on the parity check matrix H:
+#               its column p is the syndrome of a flip of bit p. If no column
+#               is zero and no two columns are equal, every code word (syndrome
+#               zero) has at least three bits set, and every single bit error
+#               has a syndrome of its own. The syndromes of no single bit must
+#               not correct anything, but flag the error. The rest is checked
+#               on the unit words: the encoder only writes code words, the
+#               decoder returns the data of a code word and corrects the bit of
+#               each syndrome. As encoder and decoder are linear, this holds
+#               for all words.
+#
+#               Up to a number of signal bits, all code words are also checked
+#               one by one with NumPy: syndrome zero, at least three bits set,
+#               decoded correctly with and without any single flipped bit.
+#
+#               A generated table file (hamming_table.py) is checked the same
+#               way: every row must be a code word and decode to its row
+#               number. With the checks of H this proves the whole table.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import re
+import sys
+import argparse
+
+from hamming_table import HammingCode, TableChunks, numpy
+from hamming_vectors import parseWidth
+
+
+# the codes are checked exhaustively up to this signal length
+_exhaustiveBits = 16
+
+# how many violations of a kind are reported at most
+_maxViolations = 10
+
+
+# Number of bits set in every element of an uint64 NumPy array
+def popcountArray(words):
+    words = words - ((words >> numpy.uint64(1)) & numpy.uint64(0x5555555555555555))
+    words = (words & numpy.uint64(0x3333333333333333)) + ((words >> numpy.uint64(2)) & numpy.uint64(0x3333333333333333))
+    words = (words + (words >> numpy.uint64(4))) & numpy.uint64(0x0f0f0f0f0f0f0f0f)
+    return (words * numpy.uint64(0x0101010101010101)) >> numpy.uint64(56)
+
+
+# Check the parity check matrix, the correction table and the unit words.
+# Returns the list of violations.
+def checkStructure(code):
+    violations = []
+
+    # the columns of H
+    columns = [code.syndrome(1 << pos) for pos in range(code.nTotalBits)]
+    first = {}
+    for pos, column in enumerate(columns):
+        if column == 0:
+            violations.append("bit {0} has syndrome 0, a flip of it is not detected".format(pos))
+        elif column in first:
+            violations.append("bits {0} and {1} have the same syndrome {2}, the minimum distance is 2".format(
+                first[column], pos, column))
+        else:
+            first[column] = pos
+            if code.correction[column] != 1 << pos:
+                violations.append("syndrome {0} of bit {1} corrects {2:#x} instead".format(column, pos, code.correction[column]))
+
+    # the syndromes no single bit error has: nothing is corrected, but like in
+    # HammingDecoder SEU_error is set. They are reached by two flipped bits.
+    for syndrome in range(1, len(code.correction)):
+        if syndrome in first:
+            continue
+        if code.correction[syndrome] != 0:
+            violations.append("syndrome {0} of no single bit corrects {1:#x}".format(syndrome, code.correction[syndrome]))
+        pair = next(((pos, first[syndrome ^ column]) for column, pos in first.items() if syndrome ^ column in first), None)
+        if pair is not None and not code.decode((1 << pair[0]) | (1 << pair[1]))[1]:
+            violations.append("syndrome {0} of bits {1} and {2} does not flag an error".format(syndrome, *pair))
+
+    # the encoder and decoder on the unit words
+    if code.encode(0) != 0 or code.decode(0) != (0, False):
+        violations.append("the zero word is not encoded or decoded as zero")
+    for bit in range(code.nSignalBits):
+        encoded = code.encode(1 << bit)
+        if code.syndrome(encoded) != 0:
+            violations.append("the encoded word {0:#x} of data bit {1} is no code word".format(encoded, bit))
+        elif code.decode(encoded) != (1 << bit, False):
+            violations.append("the encoded word {0:#x} of data bit {1} is decoded as {2:#x}".format(
+                encoded, bit, code.decode(encoded)[0]))
+    return violations
+
+
+# Check all code words one by one, in chunks. Returns the list of violations.
+def checkExhaustive(code):
+    violations = []
+    def report(kind, wrong, signals):
+        rows = numpy.nonzero(wrong)[0]
+        for row in rows[:_maxViolations]:
+            violations.append("signal {0:#x}: {1}".format(int(signals[row]), kind))
+        if len(rows) > _maxViolations:
+            violations.append("... {0} more signals: {1}".format(len(rows) - _maxViolations, kind))
+
+    for signals, encoded in TableChunks(code):
+        report("encoded word is no code word", code.syndromeArray(encoded) != 0, signals)
+        report("encoded word has less than 3 bits set", (popcountArray(encoded) < 3) & (signals != 0), signals)
+        decoded, seuError = code.decodeArray(encoded)
+        report("decoded wrong without error", (decoded != signals) | seuError, signals)
+        for pos in range(code.nTotalBits):
+            decoded, seuError = code.decodeArray(encoded ^ (numpy.uint64(1) << numpy.uint64(pos)))
+            report("decoded wrong with bit {0} flipped".format(pos), (decoded != signals) | ~seuError, signals)
+    return violations
+
+
+# Read the encoded words of a table file written by hamming_table.py
+def readTable(filename, outFormat, code):
+    tableFile = open(filename, 'rb')
+    data = tableFile.read()
+    tableFile.close()
+
+    if outFormat == 'bin':
+        nBytes = (code.nTotalBits + 7) // 8
+        if len(data) % nBytes:
+            raise ValueError("{0}: the size is no multiple of {1} bytes".format(filename, nBytes))
+        words = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, nBytes).astype(numpy.uint64)
+        shifts = numpy.arange(0, 8*nBytes, 8, dtype=numpy.uint64)
+        return numpy.bitwise_or.reduce(words << shifts, axis=1)
+    if outFormat == 'memh':
+        values = [int(word, 16) for word in data.split()]
+    elif outFormat == 'text':
+        values = [int(line.split()[1], 2) for line in data.splitlines()[1:] if line.strip()]
+    elif outFormat == 'vhdl':
+        values = [int(word, 2) for word in re.findall(r'"([01]+)"', data)]
+    else:
+        raise ValueError("unknown table format '{0}'".format(outFormat))
+    return numpy.array(values, dtype=numpy.uint64)
+
+
+# Check the rows of a table: each one is a code word and decodes to its row
+# number. Returns the list of violations.
+def checkTable(code, words):
+    violations = []
+    if len(words) != 2**code.nSignalBits:
+        violations.append("the table has {0} rows instead of {1}".format(len(words), 2**code.nSignalBits))
+    syndromes = code.syndromeArray(words)
+    decoded = code.decodeArray(words)[0]
+    rows = numpy.arange(len(words), dtype=numpy.uint64)
+    for kind, wrong in (("no code word", syndromes != 0), ("decodes to another signal", decoded != rows)):
+        wrongRows = numpy.nonzero(wrong)[0]
+        for row in wrongRows[:_maxViolations]:
+            violations.append("row {0:#x}: {1:#x} is {2}".format(int(row), int(words[row]), kind))
+        if len(wrongRows) > _maxViolations:
+            violations.append("... {0} more rows: {1}".format(len(wrongRows) - _maxViolations, kind))
+    return violations
+
+
+# All checks of one code. Returns the list of violations and a note what was
+# checked.
+def verifyCode(code, exhaustiveBits=_exhaustiveBits):
+    violations = checkStructure(code)
+    if code.nSignalBits > exhaustiveBits:
+        return violations, "structure"
+    if not code.useNumpy:
+        return violations, "structure (exhaustive check needs NumPy)"
+    return violations + checkExhaustive(code), "structure, all {0} words".format(2**code.nSignalBits)
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Verify that the Hamming codes have a minimum distance of 3 and correct "
+                    "every single bit error.")
+    parser.add_argument("widths", nargs="*", metavar="NBITS[:NBITSENC]",
+                        help="Lengths of the data (and encoded) words. Default: 1 to 64")
+    parser.add_argument("--exhaustive", type=int, default=_exhaustiveBits, metavar="NBITS",
+                        help="Check all code words one by one up to this signal length. Default: %(default)s")
+    parser.add_argument("--table", metavar="TABLE_FILE",
+                        help="Also check a table written by hamming_table.py (one width only).")
+    parser.add_argument("--format", default="bin", choices=["text", "bin", "memh", "vhdl"],
+                        help="The format of the table. Default: %(default)s")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    widths = args.widths or [str(n) for n in range(1, 65)]
+    if args.table and len(widths) != 1:
+        print "--table needs exactly one width"
+        sys.exit(1)
+
+    failed = 0
+    for width in widths:
+        try:
+            code = HammingCode(*parseWidth(width))
+        except ValueError as e:
+            failed += 1
+            print "{0}: FAILED (parameters)".format(width)
+            print "  {0}".format(e)
+            continue
+        violations, checked = verifyCode(code, args.exhaustive)
+        if args.table:
+            if numpy is None:
+                print "--table needs NumPy"
+                sys.exit(1)
+            violations += checkTable(code, readTable(args.table, args.format, code))
+            checked += ", table " + args.table
+        name = "Ham({0},{1})".format(code.nTotalBits, code.nSignalBits)
+        if violations:
+            failed += 1
+            print "{0}: FAILED ({1})".format(name, checked)
+            for violation in violations:
+                print "  " + violation
+        else:
+            print "{0}: OK ({1})".format(name, checked)
+
+    if failed:
+        print "{0} of {1} codes failed".format(failed, len(widths))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
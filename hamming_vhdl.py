@@ -0,0 +1,224 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    Specialised Hamming Components Generator
+#   ------------------------------------------
+#
+#  Description: The generic components in hamming_components.vhd calculate the
+#               parity with loops in functions, which the simulator evaluates
+#               again on every event. This script writes components for
+#               fixed widths instead: every parity bit is a plain XOR of the
+#               bits it covers, and the correction uses a constant syndrome map.
+#               The encoder and decoder entities have the same generics and
+#               ports as the generic ones, their names get the widths appended,
+#               for instance HammingEncoder_7_4 for Ham(7,4). The register and
+#               counter are configurations of the generic ones (compiled
+#               before), which bind their encoder and decoder to these, like
+#               HammingRegister_7_4. The default binding of the generic
+#               entities is not changed.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import sys
+import time
+
+from hamming_table import HammingCode
+
+
+# how many terms of a XOR tree are put into one line
+_termsPerLine = 6
+
+
+# "a xor b xor ..." over the given signal bits, broken into several lines
+def xorTree(signal, bits, indent):
+    if not bits:
+        return "'0'"
+    terms = ["{0}({1})".format(signal, bit) for bit in bits]
+    lines = [" xor ".join(terms[i:i+_termsPerLine]) for i in range(0, len(terms), _termsPerLine)]
+    return (" xor\n" + " "*indent).join(lines)
+
+
+def header(code, unit, description):
+    return (
+        "\n"
+        "--------------------------------------------------------------------------------\n"
+        "--  {0} for Ham({1},{2})\n"
+        "--  {3}\n"
+        "--------------------------------------------------------------------------------\n"
+        "\n"
+        "library IEEE;\n"
+        "use IEEE.std_logic_1164.all;\n"
+        "use IEEE.numeric_std.all;\n"
+        "\n").format(unit, code.nTotalBits, code.nSignalBits, description)
+
+
+# The widths as appended to the names, for instance 7_4 for Ham(7,4)
+def widthsName(code):
+    return "{0}_{1}".format(code.nTotalBits, code.nSignalBits)
+
+
+# Only the widths the architecture was generated for are allowed
+def genericsCheck(code, architecture):
+    return (
+        "  assert NBits = {0} and NBitsEnc = {1}\n"
+        "    report \"{2} is made for NBits = {0} and NBitsEnc = {1}\"\n"
+        "    severity failure;\n").format(code.nSignalBits, code.nTotalBits, architecture)
+
+
+def encoderVHDL(code):
+    name = "HammingEncoder_" + widthsName(code)
+    lines = [header(code, name, "Specialised version of HammingEncoder, generated by hamming_vhdl.py")]
+    lines.append(
+        "entity {0} is\n"
+        "  generic (\n"
+        "    NBits     : integer := {1};\n"
+        "    NBitsEnc  : integer := {2}\n"
+        "  );\n"
+        "  port (\n"
+        "    data_in   : in  std_logic_vector(NBits-1 downto 0);\n"
+        "    data_enc  : out std_logic_vector(NBitsEnc-1 downto 0)\n"
+        "  );\n"
+        "end {0};\n"
+        "\n"
+        "architecture {0}_RTL of {0} is\n"
+        "begin\n"
+        "\n".format(name, code.nSignalBits, code.nTotalBits))
+    lines.append(genericsCheck(code, name))
+    lines.append("\n  -- data bits\n")
+    for index, pos in enumerate(code.dataPositions):
+        lines.append("  data_enc({0}) <= data_in({1});\n".format(pos, index))
+
+    lines.append("\n  -- parity bits\n")
+    for pos, mask in zip(code.parityPositions, code.parityMasks):
+        covered = [index for index, dataPos in enumerate(code.dataPositions) if mask & (1 << dataPos)]
+        prefix = "  data_enc({0}) <= ".format(pos)
+        lines.append(prefix + xorTree("data_in", covered, len(prefix)) + ";\n")
+
+    lines.append("\nend {0}_RTL;\n\n".format(name))
+    return "".join(lines)
+
+
+def decoderVHDL(code):
+    name = "HammingDecoder_" + widthsName(code)
+    lines = [header(code, name, "Specialised version of HammingDecoder, generated by hamming_vhdl.py")]
+    lines.append(
+        "entity {0} is\n"
+        "  generic (\n"
+        "    constant NBits    : integer := {2};\n"
+        "    constant NBitsEnc : integer := {3}\n"
+        "  );\n"
+        "  port (\n"
+        "    data_enc  : in  std_logic_vector(NBitsEnc-1 downto 0);\n"
+        "    data_out  : out std_logic_vector(NBits-1 downto 0);\n"
+        "    SEU_error : out std_logic\n"
+        "  );\n"
+        "end {0};\n"
+        "\n"
+        "architecture {0}_RTL of {0} is\n"
+        "\n"
+        "  constant NParity : integer := {1};\n"
+        "\n"
+        "  -- the syndrome pointing to the position of each data bit\n"
+        "  type syndrome_map_t is array (0 to NBits-1) of std_logic_vector(NParity-1 downto 0);\n"
+        "  constant SYNDROME_MAP : syndrome_map_t := (\n".format(
+            name, code.nParityBits, code.nSignalBits, code.nTotalBits))
+    syndromes = ["    {0} => \"{1:0{2}b}\"".format(index, pos+1, code.nParityBits)
+                 for index, pos in enumerate(code.dataPositions)]
+    lines.append(",\n".join(syndromes) + "\n  );\n")
+    lines.append(
+        "\n"
+        "  constant NO_ERROR : std_logic_vector(NParity-1 downto 0) := (others => '0');\n"
+        "  signal syndrome   : std_logic_vector(NParity-1 downto 0);\n"
+        "\n"
+        "begin\n"
+        "\n")
+    lines.append(genericsCheck(code, name))
+
+    lines.append("\n  -- parity over all covered bits, including the parity bit itself\n")
+    for pBit, mask in enumerate(code.parityMasks):
+        covered = [pos for pos in range(code.nTotalBits) if mask & (1 << pos)]
+        prefix = "  syndrome({0}) <= ".format(pBit)
+        lines.append(prefix + xorTree("data_enc", covered, len(prefix)) + ";\n")
+
+    lines.append("\n  SEU_error <= '0' when syndrome = NO_ERROR else '1';\n")
+    lines.append("\n  -- data bits, flipped if the syndrome points to them\n")
+    for index, pos in enumerate(code.dataPositions):
+        lines.append("  data_out({0}) <= not data_enc({1}) when syndrome = SYNDROME_MAP({0}) else data_enc({1});\n".format(index, pos))
+
+    lines.append("\nend {0}_RTL;\n\n".format(name))
+    return "".join(lines)
+
+
+# The register and the counter keep their generic architecture, configurations
+# bind their encoder and decoder instances to the specialised entities
+def configurationsVHDL(code):
+    widths = widthsName(code)
+    lines = [
+        "\n"
+        "--------------------------------------------------------------------------------\n"
+        "--  Configurations for Ham({0},{1})\n"
+        "--------------------------------------------------------------------------------\n"
+        "\n".format(code.nTotalBits, code.nSignalBits)]
+    for entity, encoder, decoder in (("HammingRegister", "encoder", "decoder"),
+                                     ("HammingCounter", "input_encoder", "output_decoder")):
+        lines.append(
+            "configuration {0}_{1} of {0} is\n"
+            "  for {0}_RTL\n"
+            "    for {2} : HammingEncoder\n"
+            "      use entity work.HammingEncoder_{1}(HammingEncoder_{1}_RTL);\n"
+            "    end for;\n"
+            "    for {3} : HammingDecoder\n"
+            "      use entity work.HammingDecoder_{1}(HammingDecoder_{1}_RTL);\n"
+            "    end for;\n"
+            "  end for;\n"
+            "end {0}_{1};\n"
+            "\n".format(entity, widths, encoder, decoder))
+    return "".join(lines)
+
+
+# All specialised components and configurations for one Hamming code
+def componentsVHDL(code):
+    return encoderVHDL(code) + decoderVHDL(code) + configurationsVHDL(code)
+
+
+# How the program is intended to use
+def printUsage():
+    print "Usage: hamming_vhdl.py <output_file> <NBits>[:<NBitsEnc>] ..."
+    print ""
+    print "Options:"
+    print "  output_file     The VHDL file to write."
+    print "  NBits           Length of the signal word, maximum: 64"
+    print "  NBitsEnc        Length of the encoded word, default: smallest Hamming code"
+
+
+# The main program
+def main():
+    if len(sys.argv) < 3:
+        printUsage()
+        sys.exit(1)
+
+    codes = []
+    for width in sys.argv[2:]:
+        parts = width.split(':')
+        nTotalBits = int(parts[1]) if len(parts) > 1 else None
+        codes.append(HammingCode(int(parts[0]), nTotalBits))
+
+    outFile = open(sys.argv[1], 'w')
+    outFile.write("--------------------------------------------------------------------------------\n"
+                  "-- Specialised Hamming components, generated by hamming_vhdl.py\n"
+                  "-- Compile after hamming_components.vhd\n"
+                  "--     generated on {0}\n"
+                  "--------------------------------------------------------------------------------\n".format(time.strftime('%x %X %Z')))
+    for code in codes:
+        outFile.write(componentsVHDL(code))
+    outFile.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,30 +3,223 @@
 
 # Import stuff
 import sys
+from itertools import islice
+
+# how many constant lines are written at once
+_chunkLines = 1 << 12
 
 def PrintUsage():
-    print 'Usage: ./vhdl_halo_constant <constant_name> <real_value>'
+    print 'Usage: ./vhdl_halo_constant <constant_name> <real_value> [<distance>]'
+    print '       ./vhdl_halo_constant -f <state_file> [<distance>]'
     print ''
     print '  <constant_name>: Your constant name.'
     print '  <real_value>:    The real value of the signal in bit format that should be changed.'
+    print '  <state_file>:    A file with one state per line: <constant_name> <real_value>'
+    print '                   Lines starting with # are ignored.'
+    print '  <distance>:      Generate all halo states with up to this many flipped bits.'
+    print '                   Default: 1'
     print ''
     print '  Example:   ./vhdl_halo_constant TESTSIG 001'
+    print '             ./vhdl_halo_constant TESTSIG 00111 2'
+
+
+# All halo states of a value: (flipped position, halo value)
+def HaloStates(realValue, wordLength):
+    for pos in range(0, wordLength):
+        mask = 1 << pos
+        yield pos, realValue ^ mask
+
+
+# All masks of wordLength bits with exactly nBits bits set, in increasing order
+# (Gosper's hack: the next larger number with the same number of ones)
+def BitCombinations(wordLength, nBits):
+    if nBits > wordLength:
+        return
+    if nBits == 0:
+        yield 0
+        return
+    mask = (1 << nBits) - 1
+    limit = 1 << wordLength
+    while mask < limit:
+        yield mask
+        lowest = mask & -mask
+        ripple = mask + lowest
+        mask = (((ripple ^ mask) >> 2) // lowest) | ripple
+
+
+# All halo states of a value with up to distance flipped bits: (flipped
+# positions, halo value). With distance 1 these are the same as HaloStates().
+def HaloStatesK(realValue, wordLength, distance):
+    for nBits in range(1, distance+1):
+        for mask in BitCombinations(wordLength, nBits):
+            yield BitPositions(mask), realValue ^ mask
+
+
+# The positions of the bits set in a mask, lowest first
+def BitPositions(mask):
+    positions = []
+    while mask:
+        lowest = mask & -mask
+        positions.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return tuple(positions)
+
+
+def HaloName(name, positions):
+    return '_'.join([name] + [str(pos) for pos in positions])
+
+
+def ConstantLine(name, value, wordLength):
+    valueStr = str(bin(value))[2:].zfill(wordLength)
+    return 'constant {0} : state_type := "{1}";'.format(name, valueStr)
+
+
+# Read a state table: one state per line with the name and the value in bits
+def ReadStateFile(filename):
+    states = []
+    stateFile = open(filename, 'r')
+    for line in stateFile:
+        line = line.split('#')[0].split()
+        if len(line) == 2:
+            states.append((line[0], line[1]))
+    stateFile.close()
+    return states
+
+
+# Generate the valid and halo constants of all states in one pass. Every code
+# is put into an index with the constant it belongs to, so a code that is used
+# twice (valid or halo) is found by a single lookup.
+# Returns the constant lines and the list of collisions, each as a tuple of
+# (code, first constant, second constant).
+def HaloTable(states):
+    lines = []
+    owner = {}
+    collisions = []
+    wordLength = len(states[0][1]) if states else 0
+
+    for name, value in states:
+        if len(value) != wordLength:
+            raise ValueError("state {0} has {1} bits instead of {2}".format(name, len(value), wordLength))
+        realValue = int(value, 2)
+        codes = [(name, realValue)] + [('{0}_{1}'.format(name, pos), halo) for pos, halo in HaloStates(realValue, wordLength)]
+
+        if lines:
+            lines.append('')
+        for constantName, code in codes:
+            lines.append(ConstantLine(constantName, code, wordLength))
+            if code in owner:
+                collisions.append((code, owner[code], constantName))
+            else:
+                owner[code] = constantName
+
+    return lines, collisions
+
+
+# The constant lines of all states and their halos up to the given distance.
+# Unlike HaloTable() the lines are generated one after the other, so even
+# millions of halo states never have to be kept in memory.
+def HaloLines(states, distance):
+    wordLength = len(states[0][1]) if states else 0
+
+    for i, (name, value) in enumerate(states):
+        if len(value) != wordLength:
+            raise ValueError("state {0} has {1} bits instead of {2}".format(name, len(value), wordLength))
+        realValue = int(value, 2)
+        if i > 0:
+            yield ''
+        yield ConstantLine(name, realValue, wordLength)
+        for positions, halo in HaloStatesK(realValue, wordLength, distance):
+            yield ConstantLine(HaloName(name, positions), halo, wordLength)
+
+
+# Number of masks with 1 to nBits bits set in a word
+def MaskCount(wordLength, nBits):
+    count = 0
+    combinations = 1
+    for n in range(1, min(nBits, wordLength)+1):
+        combinations = combinations * (wordLength - n + 1) // n
+        count += combinations
+    return count
+
+
+# Two states share a halo code if they are at most 2*distance bits apart. Only
+# the valid codes are kept in an index. If a word has fewer masks of up to
+# 2*distance bits than there are states, the codes within this distance of
+# every state are looked up in the index, otherwise all pairs of states are
+# compared. Either way no halo code is stored, the memory stays O(states).
+# Returns a list of (first state, second state, bits apart).
+def StateCollisions(states, distance):
+    values = [(name, int(value, 2)) for name, value in states]
+    wordLength = len(states[0][1]) if states else 0
+    reach = min(2 * distance, wordLength)
+
+    if MaskCount(wordLength, reach) < len(values):
+        index = {}
+        for i, (name, value) in enumerate(values):
+            index.setdefault(value, []).append(i)
+        pairs = []
+        for i, (name, value) in enumerate(values):
+            for nBits in range(reach+1):
+                for mask in BitCombinations(wordLength, nBits):
+                    pairs.extend((i, j) for j in index.get(value ^ mask, ()) if j > i)
+        pairs.sort()
+    else:
+        pairs = [(i, j) for i in range(len(values)) for j in range(i+1, len(values))
+                 if bin(values[i][1] ^ values[j][1]).count('1') <= reach]
+
+    return [(values[i][0], values[j][0], bin(values[i][1] ^ values[j][1]).count('1'))
+            for i, j in pairs]
+
+
+# Write the lines in chunks instead of one print per line
+def WriteLines(lines, outFile):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, _chunkLines))
+        if not chunk:
+            break
+        outFile.write('\n'.join(chunk) + '\n')
+
 
 # The main program
 def main():
-    if len(sys.argv) != 3:
+    if len(sys.argv) not in (3, 4):
         PrintUsage()
         sys.exit()
+    distance = int(sys.argv[3]) if len(sys.argv) == 4 else 1
+
+    if sys.argv[1] == '-f':
+        states = ReadStateFile(sys.argv[2])
+        if distance == 1:
+            lines, collisions = HaloTable(states)
+            print '\n'.join(lines)
+
+            if collisions:
+                wordLength = len(states[0][1])
+                for code, first, second in collisions:
+                    sys.stderr.write('Collision: {0} and {1} are both "{2}"\n'.format(first, second, str(bin(code))[2:].zfill(wordLength)))
+                sys.exit(1)
+            return
+
+        WriteLines(HaloLines(states, distance), sys.stdout)
+        collisions = StateCollisions(states, distance)
+        if collisions:
+            for first, second, bitsApart in collisions:
+                sys.stderr.write('Collision: {0} and {1} are only {2} bits apart\n'.format(first, second, bitsApart))
+            sys.exit(1)
+        return
 
     constantName = sys.argv[1]
     realValue = int(sys.argv[2], 2)
     wordLength = len(sys.argv[2])
 
-    for pos in range(0, wordLength):
-        mask = 1 << pos
-        haloValue = realValue ^ mask
-        haloValueStr = str(bin(haloValue))[2:].zfill(wordLength)
-        print 'constant {0}_{1} : state_type := "{2}";'.format(constantName, pos, haloValueStr)
+    if distance == 1:
+        for pos, haloValue in HaloStates(realValue, wordLength):
+            print ConstantLine('{0}_{1}'.format(constantName, pos), haloValue, wordLength)
+        return
+
+    WriteLines((ConstantLine(HaloName(constantName, positions), haloValue, wordLength)
+                for positions, haloValue in HaloStatesK(realValue, wordLength, distance)), sys.stdout)
 
 
 if __name__ == '__main__':
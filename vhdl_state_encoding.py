@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: utf-8
+
+# ------------------------------------------------------------------------------
+#
+#    State Encoding Search for Hamming protected State Machines
+#   ------------------------------------------------------------
+#
+#  Description: Finds codes for the states of a state machine, which have at
+#               least a given Hamming distance to each other (3 to have non
+#               overlapping halos of single bit flips), using as few bits as
+#               possible. The result is printed as the VHDL constant block
+#               with all valid and halo states (see vhdl_halo_constant.py),
+#               the halos with up to (distance-1)/2 flipped bits.
+#
+#               The search is a backtracking over the codes in increasing
+#               order. All codes closer than the distance to an already chosen
+#               code are marked in a bitset (a python integer with one bit per
+#               code), so the next candidates are just the free bits of it.
+#               Symmetries are removed by fixing the first code to 0 and the
+#               second one to the form 0..01..1 (any other choice is only a
+#               permutation of the bits). The widths are tried in parallel.
+#
+#  Revisions:
+#    1.0 Initial revision
+#
+# ------------------------------------------------------------------------------
+
+# Import stuff
+import sys
+import argparse
+import multiprocessing
+from itertools import combinations
+
+from vhdl_halo_constant import HaloLines, WriteLines
+
+
+# how many search nodes to try for one width before giving up
+_maxNodes = 1000000
+
+
+# All bit masks with less than distance bits set
+def BallMasks(width, distance):
+    masks = []
+    for weight in range(0, distance):
+        for bits in combinations(range(width), weight):
+            masks.append(sum(1 << bit for bit in bits))
+    return masks
+
+
+# The number of codes, which can't be used anymore for every chosen code
+def BallSize(width, radius):
+    size = 0
+    binomial = 1
+    for i in range(0, radius+1):
+        size += binomial
+        binomial = binomial * (width - i) // (i + 1)
+    return size
+
+
+# Is there room for so many states at all? (sphere packing bound)
+def WidthPossible(nStates, width, distance):
+    return nStates * BallSize(width, (distance - 1) // 2) <= 2**width
+
+
+# Search codes for nStates states with the given width. Returns the list of
+# codes, or None if none were found within maxNodes search steps.
+def FindCodes(nStates, width, distance, maxNodes=_maxNodes):
+    ball = BallMasks(width, distance)
+    allCodes = (1 << 2**width) - 1
+    nodes = [0]
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), nStates + 100))
+
+    # forbid all codes around the given one
+    def forbid(forbidden, code):
+        for mask in ball:
+            forbidden |= 1 << (code ^ mask)
+        return forbidden
+
+    def search(codes, forbidden):
+        if len(codes) == nStates:
+            return codes
+        nodes[0] += 1
+        if nodes[0] > maxNodes:
+            return None
+
+        # free codes above the last one, in increasing order
+        free = allCodes & ~forbidden & ~((2 << codes[-1]) - 1)
+        if bin(free).count('1') < nStates - len(codes):
+            return None
+        while free:
+            lowest = free & -free
+            code = lowest.bit_length() - 1
+            found = search(codes + [code], forbid(forbidden, code))
+            if found or nodes[0] > maxNodes:
+                return found
+            free ^= lowest
+        return None
+
+    if nStates == 1:
+        return [0]
+    start = forbid(0, 0)
+    for ones in range(distance, width+1):
+        second = (1 << ones) - 1
+        found = search([0, second], forbid(start, second))
+        if found or nodes[0] > maxNodes:
+            return found
+    return None
+
+
+def _findCodesJob(job):
+    return job[1], FindCodes(*job)
+
+
+# Try the widths from the smallest possible one upwards, several of them in
+# parallel. Returns the width and the codes.
+def SearchEncoding(nStates, distance, processes=None, maxNodes=_maxNodes, maxWidth=24):
+    width = 1
+    while not WidthPossible(nStates, width, distance):
+        width += 1
+
+    pool = multiprocessing.Pool(processes) if processes != 1 else None
+    nParallel = (processes or multiprocessing.cpu_count()) if pool else 1
+    try:
+        while width <= maxWidth:
+            jobs = [(nStates, w, distance, maxNodes) for w in range(width, min(width + nParallel, maxWidth + 1))]
+            results = pool.map(_findCodesJob, jobs, chunksize=1) if pool else map(_findCodesJob, jobs)
+            for w, codes in results:
+                if codes:
+                    return w, codes
+            width += len(jobs)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return None, None
+
+
+# The command line options
+def parseArguments():
+    parser = argparse.ArgumentParser(
+        description="Find state codes with a minimum Hamming distance and print the VHDL "
+                    "constants of all valid and halo states.")
+    parser.add_argument("states", help="Either the number of states or a file with one state name per line.")
+    parser.add_argument("distance", nargs="?", type=int, default=3,
+                        help="Minimum Hamming distance between two states. Default: %(default)s")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Number of worker processes. Default: one per CPU")
+    parser.add_argument("--max-nodes", dest="maxNodes", type=int, default=_maxNodes,
+                        help="Give up a width after this many search steps. Default: %(default)s")
+    return parser.parse_args()
+
+
+# The main program
+def main():
+    args = parseArguments()
+
+    if args.states.isdigit():
+        names = ["S{0}".format(i) for i in range(int(args.states))]
+    else:
+        stateFile = open(args.states, 'r')
+        names = [line.split('#')[0].strip() for line in stateFile]
+        names = [name for name in names if name]
+        stateFile.close()
+
+    width, codes = SearchEncoding(len(names), args.distance, args.jobs, args.maxNodes)
+    if codes is None:
+        sys.stderr.write("No encoding found.\n")
+        sys.exit(1)
+
+    # the halos of all states with as many flipped bits as can be corrected
+    radius = (args.distance - 1) // 2
+    print "-- {0} states with a Hamming distance of at least {1}, halos of up to {2} flipped bits".format(
+        len(names), args.distance, radius)
+    print "subtype state_type is std_logic_vector({0} downto 0);".format(width-1)
+    print ""
+    states = [(name, str(bin(code))[2:].zfill(width)) for name, code in zip(names, codes)]
+    sys.stdout.flush()
+    WriteLines(HaloLines(states, radius), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()